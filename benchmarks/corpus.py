@@ -0,0 +1,175 @@
+# Recorded page corpora for the scraper benchmarks
+import gzip
+import json
+import os
+import random
+from urllib.parse import urlsplit
+
+from scripts.archive import PageArchive
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def _request_path(url):
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+
+class Corpus:
+    """
+    A directory of gzipped pages keyed by request path, served by the stand-in server.
+
+    `manifest.json` maps every request path (e.g. '/ar/egypt/jobs/?page=1') to its file and kind ('listing' or
+    'detail'), and records the country and the number of listing pages.
+
+    Args:
+        root (str): The corpus directory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, 'manifest.json'), encoding='utf-8') as file:
+            manifest = json.load(file)
+        self.country = manifest['country']
+        self.listing_pages = manifest['listing_pages']
+        self.pages = manifest['pages']
+
+    def get(self, path):
+        """
+        Reads a page of the corpus, still gzipped.
+
+        Args:
+            path (str): The request path.
+
+        Returns:
+            bytes or None: The gzipped page, or None if the corpus does not hold it.
+        """
+        entry = self.pages.get(path)
+        if entry is None:
+            return None
+        with open(os.path.join(self.root, entry['file']), 'rb') as file:
+            return file.read()
+
+    def count(self, kind):
+        """
+        Counts the pages of one kind.
+
+        Args:
+            kind (str): 'listing' or 'detail'.
+
+        Returns:
+            int: The number of pages.
+        """
+        return sum(entry['kind'] == kind for entry in self.pages.values())
+
+
+class _CorpusWriter:
+    def __init__(self, root, country):
+        self.root = root
+        self.country = country
+        self.pages = {}
+        os.makedirs(os.path.join(root, 'pages'), exist_ok=True)
+
+    def add(self, path, html, kind):
+        name = os.path.join('pages', f'{len(self.pages):06d}.html.gz')
+        with gzip.open(os.path.join(self.root, name), 'wb') as file:
+            file.write(html.encode('utf-8'))
+        self.pages[path] = {'file': name, 'kind': kind}
+
+    def close(self):
+        manifest = {
+            'country': self.country,
+            'listing_pages': sum(entry['kind'] == 'listing' for entry in self.pages.values()),
+            'pages': self.pages,
+        }
+        with open(os.path.join(self.root, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=1)
+
+
+def record_from_archive(country, root, archive=None, listing_pages=None):
+    """
+    Exports the latest archived listing and detail pages of a country as a benchmark corpus.
+
+    Pages are taken from a crawl run with `--archive`, so the corpus is the real markup the scraper parses.
+
+    Args:
+        country (str): The country slug.
+        root (str): The corpus directory to write.
+        archive (PageArchive, optional): The archive to export. Defaults to the archive in `data/archive`.
+        listing_pages (int, optional): Only export listing pages up to this number and their detail pages.
+            Defaults to all.
+
+    Returns:
+        Corpus: The written corpus.
+    """
+    if archive is None:
+        archive = PageArchive()
+    rows = archive.conn.execute(
+        'SELECT url, kind, page, digest FROM pages WHERE id IN '
+        '(SELECT MAX(id) FROM pages WHERE country = ? GROUP BY url) ORDER BY id',
+        (country,)
+    ).fetchall()
+
+    writer = _CorpusWriter(root, country)
+    for url, kind, page, digest in rows:
+        if listing_pages is None or (page is not None and page <= listing_pages):
+            writer.add(_request_path(url), archive.get(digest), kind)
+    writer.close()
+    return Corpus(root)
+
+
+def _synthetic_detail(job, rng, filler):
+    return f'''<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="utf-8"><title>وظيفة {job}</title>
+<script>{filler[:rng.randint(20000, 60000)]}</script><link rel="stylesheet" href="/css/app.css"></head><body>
+<header><nav>{''.join(f'<a class="nav-link" href="/ar/menu-{i}/">قائمة {i}</a>' for i in range(40))}</nav></header>
+<main><div class="card"><h1 id="job_title">محاسب عام {job}</h1>
+<a class="t-default t-bold" href="/ar/company/company-{job % 97}/">شركة {job % 97}</a>
+<span class="t-mute">مصر · القاهرة</span><span id="jb-posted-date">قبل {job % 30} أيام</span></div>
+<div data-automation-id="id_salary_range">{rng.choice(['غير محدد', '5000 - 8000 جنيه'])}</div>
+<div data-automation-id="id_type_level_experience">دوام كامل · متوسط الخبرة · {job % 10} سنوات</div>
+<div data-automation-id="id_number_of_vacancies">عدد الوظائف الشاغرة {job % 5 + 1}</div>
+<div data-automation-id="id_company_employees_industry">المحاسبة · 50 - 99 موظف</div>
+<div class="card-content p20t is-spaced"><h2>الوصف الوظيفي</h2><div>{'مسؤوليات الوظيفة. ' * rng.randint(20, 80)}</div></div>
+<div class="card-content is-spaced t-break print-break-before p20t">Excel, SAP, التقارير المالية</div>
+<div data-automation-id="data_الجنس">{rng.choice(['ذكر', 'أنثى', 'أي'])}</div>
+<div data-automation-id="data_العمر">{rng.randint(22, 45)}</div>
+<div data-automation-id="data_الشهادة">بكالوريوس</div>
+<div data-automation-id="data__المستوى_المهني">متوسط الخبرة</div></main>
+<footer>{''.join(f'<a href="/ar/footer-{i}/">رابط {i}</a>' for i in range(120))}</footer></body></html>'''
+
+
+def _synthetic_listing(country, jobs):
+    cards = ''.join(
+        f'<li class="has-pointer-d"><h2><a data-js-aid="jobID" href="/ar/{country}/jobs/accountant-{job}/">'
+        f'محاسب عام {job}</a></h2><div class="jb-company t-small">شركة {job % 97}</div>'
+        f'<div class="jb-loc">مصر · القاهرة</div><div class="jb-date">قبل {job % 30} أيام</div></li>'
+        for job in jobs
+    )
+    return f'<!DOCTYPE html><html lang="ar"><head><meta charset="utf-8"></head><body><ul>{cards}</ul></body></html>'
+
+
+def synthesize(root, country='egypt', listing_pages=10, per_page=20, seed=0):
+    """
+    Writes a synthetic corpus whose pages carry the markup the extractor's selectors target, padded with inline
+    scripts and navigation to the size of real bayt.com pages. Useful when no recorded crawl is at hand.
+
+    Args:
+        root (str): The corpus directory to write.
+        country (str, optional): The country slug used in the paths. Defaults to 'egypt'.
+        listing_pages (int, optional): The number of listing pages. Defaults to 10.
+        per_page (int, optional): The number of jobs per listing page. Defaults to 20.
+        seed (int, optional): The random seed, so the same arguments always give the same corpus. Defaults to 0.
+
+    Returns:
+        Corpus: The written corpus.
+    """
+    rng = random.Random(seed)
+    filler = 'var config = {"key": "value", "items": [1, 2, 3]};\n' * 1500
+    writer = _CorpusWriter(root, country)
+    for page in range(1, listing_pages + 1):
+        jobs = range(5000000 + (page - 1) * per_page, 5000000 + page * per_page)
+        writer.add(f'/ar/{country}/jobs/?page={page}', _synthetic_listing(country, jobs), 'listing')
+        for job in jobs:
+            writer.add(f'/ar/{country}/jobs/accountant-{job}/', _synthetic_detail(job, rng, filler), 'detail')
+    writer.close()
+    return Corpus(root)
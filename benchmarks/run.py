@@ -0,0 +1,203 @@
+# Offline throughput benchmark of the scraper
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.corpus import CORPUS_DIR, Corpus, record_from_archive, synthesize
+from benchmarks.server import StandInServer
+from scripts.archive import PageArchive
+from scripts.crawl_metrics import CrawlMetrics
+from scripts.crawl_store import Checkpoints, SeenJobs
+from scripts.extractor import PARSERS
+from scripts.fetcher import ScraperSession, TokenBucket
+from scripts.scrape_jobs import scrapping
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# The knobs that identify a benchmark setting; results of two runs are compared setting by setting.
+SETTING_KEYS = ('workers', 'parse_workers', 'latency', 'jitter', 'error_rate', 'rate', 'parser', 'stream')
+
+
+def _peak_rss_mib(who):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def run_setting(corpus_root, workers=8, parse_workers=0, latency=0.0, jitter=0.0, error_rate=0.0, rate=None,
+                parser='lxml', seed=0, stream=False):
+    """
+    Crawls a corpus through the stand-in server once and measures the run.
+
+    Call it in a fresh process per setting (as `main` does), since peak RSS only ever grows within a process.
+
+    Args:
+        corpus_root (str): The corpus directory.
+        workers (int, optional): The number of concurrent detail requests. Defaults to 8.
+        parse_workers (int, optional): The number of parser processes; 0 parses in the I/O threads. Defaults to 0.
+        latency (float, optional): The server response delay in seconds. Defaults to 0.
+        jitter (float, optional): The upper bound of an extra random server delay in seconds. Defaults to 0.
+        error_rate (float, optional): The share of requests the server fails with 429/503. Defaults to 0.
+        rate (float, optional): The initial rate of an adaptive TokenBucket, or None for no rate limit.
+            Defaults to None.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        seed (int, optional): The seed of the injected errors and jitter. Defaults to 0.
+        stream (bool, optional): If True, detail pages are streamed and only read up to their last field.
+            Defaults to False.
+
+    Returns:
+        dict: The setting, the jobs scraped, pages/s, parse ms/page, request statistics and peak RSS in MiB.
+    """
+    corpus = Corpus(corpus_root)
+    metrics = CrawlMetrics()
+    limiter = TokenBucket(rate=rate, burst=rate, max_rate=rate * 10) if rate else None
+    session = ScraperSession(pool_size=workers, backoff=0.05, max_backoff=1, limiter=limiter, metrics=metrics)
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StandInServer(corpus, latency, jitter, error_rate, seed=seed) as server:
+        state = os.path.join(workdir, 'state.db')
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            jobs = scrapping(corpus.country, corpus.listing_pages + 1, base_url=server.base_url, max_workers=workers,
+                             per_host=workers, session=session, seen=SeenJobs(state), checkpoints=Checkpoints(state),
+                             parser=parser, parse_workers=parse_workers, output=os.path.join(workdir, 'raw.csv'),
+                             metrics=metrics, stream=stream)
+        seconds = time.perf_counter() - start
+
+    summary = metrics.summary()
+    pages = summary['pages']
+    return {
+        'workers': workers, 'parse_workers': parse_workers, 'latency': latency, 'jitter': jitter,
+        'error_rate': error_rate, 'rate': rate, 'parser': parser, 'stream': stream,
+        'jobs': jobs,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round((jobs + corpus.listing_pages) / seconds, 2),
+        'jobs_per_second': round(jobs / seconds, 2),
+        'detail_parse_ms': round(pages['detail']['parse_seconds']['mean'] * 1000, 3),
+        'listing_parse_ms': round(pages['listing']['parse_seconds']['mean'] * 1000, 3),
+        'requests': summary['requests'],
+        'retries': summary['retries'],
+        'megabytes': round(summary['bytes'] / 2 ** 20, 2),
+        'peak_rss_mib': _peak_rss_mib(resource.RUSAGE_SELF),
+        'peak_child_rss_mib': _peak_rss_mib(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _setting_key(result):
+    # Runs saved before a knob existed ran with its default.
+    return tuple(result.get(key, False if key == 'stream' else None) for key in SETTING_KEYS)
+
+
+def compare(current, previous):
+    """
+    Prints the change in pages/s, parse time and peak RSS of every setting present in both runs.
+
+    Args:
+        current (dict): The results of this run.
+        previous (dict): The results of an earlier run.
+    """
+    before = {_setting_key(result): result for result in previous['results']}
+    print(f"Compared with {previous['started']} ({previous.get('commit') or 'unknown commit'}):")
+    for result in current['results']:
+        old = before.get(_setting_key(result))
+        if old is None:
+            continue
+        change = (result['pages_per_second'] / old['pages_per_second'] - 1) * 100 if old['pages_per_second'] else 0
+        print(f"  workers={result['workers']:<3} parse_workers={result['parse_workers']:<3} "
+              f"pages/s {old['pages_per_second']:>8.1f} -> {result['pages_per_second']:>8.1f} ({change:+.1f}%)  "
+              f"parse ms {old['detail_parse_ms']:.2f} -> {result['detail_parse_ms']:.2f}  "
+              f"RSS MiB {old['peak_rss_mib']:.0f} -> {result['peak_rss_mib']:.0f}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark the scraper against a local stand-in server.')
+    arg_parser.add_argument('--corpus', default=os.path.join(CORPUS_DIR, 'synthetic'), help='The corpus directory.')
+    arg_parser.add_argument('--synthesize', type=int, metavar='PAGES',
+                            help='Write a synthetic corpus with this many listing pages first.')
+    arg_parser.add_argument('--record', metavar='COUNTRY', help='Export the archived pages of a country first.')
+    arg_parser.add_argument('--archive', default=os.path.join(REPO_ROOT, 'data', 'archive'),
+                            help='The page archive --record exports from.')
+    arg_parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16],
+                            help='The detail-fetch concurrencies to measure.')
+    arg_parser.add_argument('--parse-workers', type=int, nargs='+', default=[0],
+                            help='The parser process counts to measure; 0 parses in the I/O threads.')
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='Server response delay in seconds.')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Extra random server delay in seconds.')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failed with 429/503.')
+    arg_parser.add_argument('--rate', type=float, default=None, help='Initial rate of the adaptive rate limiter.')
+    arg_parser.add_argument('--parser', default='lxml', choices=PARSERS, help='The HTML parser backend.')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='Stream detail pages, stopping once their fields are read.')
+    arg_parser.add_argument('--output', default=RESULTS_DIR, help='The directory results are saved in.')
+    arg_parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+
+    if args.single:
+        print(json.dumps(run_setting(args.corpus, **json.loads(args.single))))
+        return
+
+    if args.synthesize:
+        synthesize(args.corpus, listing_pages=args.synthesize)
+    elif args.record:
+        record_from_archive(args.record, args.corpus, PageArchive(args.archive))
+    if not os.path.exists(os.path.join(args.corpus, 'manifest.json')):
+        arg_parser.error(f'no corpus at {args.corpus}; create one with --synthesize or --record')
+    corpus = Corpus(args.corpus)
+
+    run = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'corpus': {'path': os.path.relpath(args.corpus, REPO_ROOT), 'listing_pages': corpus.listing_pages,
+                   'detail_pages': corpus.count('detail')},
+        'results': [],
+    }
+    print(f"Corpus: {corpus.listing_pages} listing and {corpus.count('detail')} detail pages")
+    for parse_workers in args.parse_workers:
+        for workers in args.workers:
+            setting = {'workers': workers, 'parse_workers': parse_workers, 'latency': args.latency,
+                       'jitter': args.jitter, 'error_rate': args.error_rate, 'rate': args.rate,
+                       'parser': args.parser, 'stream': args.stream}
+            process = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.run', '--corpus', args.corpus, '--single', json.dumps(setting)],
+                cwd=REPO_ROOT, capture_output=True, text=True, check=True
+            )
+            result = json.loads(process.stdout.splitlines()[-1])
+            run['results'].append(result)
+            print(f"workers={workers:<3} parse_workers={parse_workers:<3} {result['pages_per_second']:>8.1f} pages/s "
+                  f"{result['detail_parse_ms']:>7.2f} parse ms/page {result['retries']:>4} retries "
+                  f"{result['peak_rss_mib']:>7.1f} MiB peak RSS")
+
+    os.makedirs(args.output, exist_ok=True)
+    previous = sorted(glob.glob(os.path.join(args.output, '*.json')))
+    path = os.path.join(args.output, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(run, file, indent=2)
+    print(f"Saved results to {path}")
+    if previous:
+        with open(previous[-1], encoding='utf-8') as file:
+            compare(run, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# Local stand-in for bayt.com serving a recorded corpus
+import gzip
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Served for listing pages past the end of the corpus, so a crawl stops there as it does on the live site.
+EMPTY_LISTING = '<!DOCTYPE html><html lang="ar"><head><meta charset="utf-8"></head><body><ul></ul></body></html>'
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class StandInServer:
+    """
+    A threaded HTTP server that replays a Corpus with configurable latency and injected errors.
+
+    Pages are served gzip-compressed with keep-alive, like the live site. Every response is delayed by `latency`
+    plus a uniform random `jitter`, and a share `error_rate` of requests is answered with one of `error_statuses`
+    instead, so retries and the adaptive rate limiter are exercised too. Use it as a context manager; `base_url`
+    is the root to crawl and `hits` counts the requests served.
+
+    The detail pages are also listed in a sitemap in the live site's format: an index at '/sitemap.xml' pointing to
+    child sitemaps of `sitemap_size` pages each. Every page has a `lastmod`, the server start time until `touch`
+    marks it changed, and a child sitemap's `lastmod` is the latest of its pages. Detail pages carry an ETag and a
+    Last-Modified derived from their `lastmod` and conditional requests are answered with 304; `remove` makes a page
+    answer 404, as a closed job does.
+
+    Args:
+        corpus (Corpus): The pages to serve.
+        latency (float, optional): The base response delay in seconds. Defaults to 0.
+        jitter (float, optional): The upper bound of an extra random delay in seconds. Defaults to 0.
+        error_rate (float, optional): The share of requests answered with an error. Defaults to 0.
+        error_statuses (tuple, optional): The error statuses to pick from. Defaults to (429, 503).
+        seed (int, optional): The seed of the error and jitter draws. Defaults to None.
+        port (int, optional): The port to listen on. Defaults to a free port.
+        sitemap_size (int, optional): The number of pages per child sitemap. Defaults to 1000.
+    """
+
+    def __init__(self, corpus, latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(429, 503), seed=None,
+                 port=0, sitemap_size=1000):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.hits = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._empty_listing = gzip.compress(EMPTY_LISTING.encode('utf-8'))
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        started = datetime.now(timezone.utc).replace(microsecond=0)
+        details = [path for path, entry in corpus.pages.items() if entry['kind'] == 'detail']
+        self._sitemaps = [details[i:i + sitemap_size] for i in range(0, len(details), sitemap_size)]
+        self.lastmod = dict.fromkeys(details, started)
+        # The last time a page was dropped from each child sitemap, which changes its lastmod as well.
+        self._dropped = [started] * len(self._sitemaps)
+
+    def touch(self, path, when=None):
+        """
+        Marks a detail page as changed in the sitemap.
+
+        Args:
+            path (str): The request path of the page.
+            when (datetime, optional): The change time, timezone-aware. Defaults to now.
+        """
+        self.lastmod[path] = (when or datetime.now(timezone.utc)).replace(microsecond=0)
+
+    @property
+    def base_url(self):
+        """
+        str: The root URL of the server.
+        """
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def remove(self, path):
+        """
+        Takes a detail page down, as when its job closes: it is answered with 404 and dropped from its sitemap.
+
+        Args:
+            path (str): The request path of the page.
+        """
+        with self._lock:
+            self.corpus.pages.pop(path, None)
+            self.lastmod.pop(path, None)
+            for number, pages in enumerate(self._sitemaps):
+                if path in pages:
+                    pages.remove(path)
+                    self._dropped[number] = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def validators(self, path):
+        """
+        Returns the ETag and Last-Modified of a detail page, or (None, None) for any other path.
+
+        Args:
+            path (str): The request path.
+
+        Returns:
+            tuple: (etag, last_modified).
+        """
+        lastmod = self.lastmod.get(path)
+        if lastmod is None:
+            return None, None
+        return f'"{int(lastmod.timestamp()):x}"', formatdate(lastmod.timestamp(), usegmt=True)
+
+    def _sitemap(self, path):
+        if path == '/sitemap.xml':
+            entries = ''.join(
+                f'<sitemap><loc>{self.base_url}/sitemap-jobs-{number}.xml</loc>'
+                f'<lastmod>{max([self.lastmod[page] for page in pages] + [dropped]).isoformat()}</lastmod></sitemap>'
+                for number, (pages, dropped) in enumerate(zip(self._sitemaps, self._dropped), 1)
+            )
+            document = f'<sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+        else:
+            number = path[len('/sitemap-jobs-'):-len('.xml')]
+            if not number.isdigit() or not 1 <= int(number) <= len(self._sitemaps):
+                return None
+            entries = ''.join(f'<url><loc>{self.base_url}{page}</loc><lastmod>{self.lastmod[page].isoformat()}'
+                              f'</lastmod></url>' for page in self._sitemaps[int(number) - 1])
+            document = f'<urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'
+        return gzip.compress(f'<?xml version="1.0" encoding="UTF-8"?>{document}'.encode('utf-8'))
+
+    def _respond(self, path):
+        with self._lock:
+            self.hits += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.error_rate and self._random.random() < self.error_rate
+            status = self._random.choice(self.error_statuses) if failed else 200
+        time.sleep(delay)
+        if status != 200:
+            return status, None
+
+        if path.startswith('/sitemap'):
+            with self._lock:
+                body = self._sitemap(path)
+            return (200, body) if body is not None else (404, None)
+        body = self.corpus.get(path)
+        if body is None and 'page=' in path:
+            body = self._empty_listing
+        return (200, body) if body is not None else (404, None)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                # Streamed downloads close the connection once they have read enough of a page.
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass
+
+            def do_GET(self):
+                status, body = server._respond(self.path)
+                etag, last_modified = server.validators(self.path) if status == 200 else (None, None)
+                if etag is not None and self.headers.get('If-None-Match') == etag:
+                    status, body = 304, None
+                self.send_response(status)
+                if etag is not None:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                if body is None:
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                content_type = 'application/xml' if self.path.startswith('/sitemap') else 'text/html'
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    self.send_header('Content-Encoding', 'gzip')
+                else:
+                    body = gzip.decompress(body)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -1,11 +1,17 @@
 #%% md
 # ### Import required libraries
 # - Import `clean_data` module from `scripts`.
+# - Import `drop_near_duplicates` from `scripts.dedup`.
+# - Import `TitleStore` from `scripts.titles`.
+# - Import `TranslationService` from `scripts.translation`.
 # - Import `sqlite3` for database interaction.
 # - Import `warnings` and disable warnings.
 # - Import `pandas` for data manipulation.
 #%%
 from scripts.clean_data import *
+from scripts.dedup import drop_near_duplicates
+from scripts.titles import TitleStore
+from scripts.translation import TranslationService
 import sqlite3
 import warnings
 import pandas as pd
@@ -28,6 +34,14 @@ split_column(df_egypt, 'location', [1], '·', ['city'], reverse=True)
 split_career_level(df_egypt)
 df_egypt.head(15)
 #%% md
+# ### Drop near-duplicate postings
+# - The same vacancy is often reposted under a slightly different title or cross-posted by several recruiters.
+# - `drop_near_duplicates` compares the normalized `title`, `company_name`, `city` and `description` with MinHash/LSH and keeps the first posting of each group.
+# - The `duplicates` column counts the copies collapsed into each posting.
+#%%
+df_egypt = drop_near_duplicates(df_egypt)
+df_egypt['duplicates'].sum()
+#%% md
 # ### Clean and combine experience columns
 # - Replace 'Unknown' values in `exp` column with `NaN`.
 # - Combine `experience` column with `exp` column into a new column `experience_` using `combine_first`.
@@ -98,12 +112,14 @@ df_egypt.sort_values(by=['title'], ascending=False, inplace=True)
 # 1. **Manual Cleaning of 'title' Column**:
 #    - Some manual adjustments were made to the 'title' column before starting the translation.
 # 2. **Translate the 'title' Column**:
-#    - After the manual cleaning, the translation was applied to the 'title' column for the first 400 rows using the `apply_translation` function.
+#    - After the manual cleaning, the whole 'title' column is translated with the `apply_translation` function: glossary titles first, then cached translations, then batched calls to the translator, within a 10-minute budget (titles left over keep their text and are translated on the next run).
 # 3. **Save the Data**
 #%%
 df_egypt = pd.read_csv('../data/processed/egypt_clean.csv')
 df_egypt.sort_values(by=['title'], ascending=False, inplace=True)
-apply_translation(df_egypt, 'title', rows=df_egypt.iloc[:40, :].index.tolist())
+translator = TranslationService(time_budget=600)
+apply_translation(df_egypt, 'title', service=translator)
+print(translator.counters)
 #%%
 df_egypt = df_egypt[~df_egypt['title'].str.contains('سعودية', na=False)]
 df_egypt = df_egypt[~df_egypt['title'].str.contains('سعوديه', na=False)]
@@ -171,6 +187,7 @@ df_egypt.head(15)
 #    - Cleaned up job titles to ensure they follow the correct format without extra symbols, spaces, or unnecessary words.
 # 2. **Title Editing**:
 #    - Applied a predefined title mapping (`edite_title_mapping`) to standardize job titles, ensuring consistency across the dataset (e.g., "cashier" becomes "cashier", "driller" becomes "drilling operator").
+#    - Mapped titles are kept in `data/titles.db` (`TitleStore`), so after editing the mapping only the titles matched by the added, removed or edited patterns are mapped again.
 # 3. **Save the Data**:
 #    - The cleaned titles were saved back into the database for further analysis, ensuring all records follow the standardized format.
 #%%
@@ -498,7 +515,9 @@ df_egypt = df_egypt.sort_values(by="title", ascending=False, key=lambda col: col
 #%%
 review_matches(df_egypt, final_mapping_title_egypt)
 #%%
-edit_title(df_egypt, final_mapping_title_egypt)
+title_store = TitleStore()
+edit_title(df_egypt, final_mapping_title_egypt, store=title_store, name='egypt')
+print(title_store.stats)
 df_egypt.title.value_counts()
 #%%
 conn = sqlite3.connect('../data/database.db')
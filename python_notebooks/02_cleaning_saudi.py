@@ -1,11 +1,17 @@
 #%% md
 # ### Import required libraries
 # - Import `clean_data` module from `scripts`.
+# - Import `drop_near_duplicates` from `scripts.dedup`.
+# - Import `TitleStore` from `scripts.titles`.
+# - Import `TranslationService` from `scripts.translation`.
 # - Import `sqlite3` for database interaction.
 # - Import `warnings` and disable warnings.
 # - Import `pandas` for data manipulation.
 #%%
 from scripts.clean_data import *
+from scripts.dedup import drop_near_duplicates
+from scripts.titles import TitleStore
+from scripts.translation import TranslationService
 import sqlite3
 import warnings
 import pandas as pd
@@ -28,6 +34,14 @@ split_column(df_saudi, 'location', [1], '·', ['city'], reverse=True)
 split_career_level(df_saudi)
 df_saudi.head(15)
 #%% md
+# ### Drop near-duplicate postings
+# - The same vacancy is often reposted under a slightly different title or cross-posted by several recruiters.
+# - `drop_near_duplicates` compares the normalized `title`, `company_name`, `city` and `description` with MinHash/LSH and keeps the first posting of each group.
+# - The `duplicates` column counts the copies collapsed into each posting.
+#%%
+df_saudi = drop_near_duplicates(df_saudi)
+df_saudi['duplicates'].sum()
+#%% md
 # ### Clean and combine experience columns
 # - Replace 'Unknown' values in `exp` column with `NaN`.
 # - Combine `experience` column with `exp` column into a new column `experience_` using `combine_first`.
@@ -98,12 +112,14 @@ df_saudi.sort_values(by=['title'], ascending=False, inplace=True)
 # 1. **Manual Cleaning of 'title' Column**:
 #    - Some manual adjustments were made to the 'title' column before starting the translation.
 # 2. **Translate the 'title' Column**:
-#    - After the manual cleaning, the translation was applied to the 'title' column for the first 400 rows using the `apply_translation` function.
+#    - After the manual cleaning, the whole 'title' column is translated with the `apply_translation` function: glossary titles first, then cached translations, then batched calls to the translator, within a 10-minute budget (titles left over keep their text and are translated on the next run).
 # 3. **Save the Data**
 #%%
 df_saudi = pd.read_csv('../data/processed/saudi_arabia.csv')
 df_saudi.sort_values(by=['title'], ascending=False, inplace=True)
-apply_translation(df_saudi, 'title', rows=df_saudi.iloc[:400, :].index.tolist())
+translator = TranslationService(time_budget=600)
+apply_translation(df_saudi, 'title', service=translator)
+print(translator.counters)
 #%% md
 # ### Data Transformation Process
 # 1. **Manual Update on 'experience_' Column**:
@@ -170,6 +186,7 @@ df_saudi.head(15)
 #    - Cleaned up job titles to ensure they follow the correct format without extra symbols, spaces, or unnecessary words.
 # 2. **Title Editing**:
 #    - Applied a predefined title mapping (`edite_title_mapping`) to standardize job titles, ensuring consistency across the dataset (e.g., "cashier" becomes "cashier", "driller" becomes "drilling operator").
+#    - Mapped titles are kept in `data/titles.db` (`TitleStore`), so after editing the mapping only the titles matched by the added, removed or edited patterns are mapped again.
 # 3. **Save the Data**:
 #    - The cleaned titles were saved back into the database for further analysis, ensuring all records follow the standardized format.
 #%%
@@ -573,7 +590,9 @@ df_saudi = df_saudi.sort_values(by="title", ascending=False, key=lambda col: col
 #%%
 review_matches(df_saudi, final_mapping_title_saudi)
 #%%
-edit_title(df_saudi, final_mapping_title_saudi)
+title_store = TitleStore()
+edit_title(df_saudi, final_mapping_title_saudi, store=title_store, name='saudi')
+print(title_store.stats)
 df_saudi.title.value_counts()
 #%%
 conn = sqlite3.connect('../data/database.db')
@@ -503,6 +503,70 @@ def plot_job_trend_over_time(data, plot_name, folder: Literal['egypt', 'saudi',
     return fig
 
 
+def plot_open_jobs_over_time(lifetimes, plot_name, folder: Literal['egypt', 'saudi', 'compare'], save=True, freq='D'):
+    """
+    Plot how many jobs were open, and how many closed, in every period.
+
+    Unlike plot_job_trend_over_time, which only counts posting dates, this uses the lifetimes tracked by
+    revisits (`scrape_jobs revisit`): a job counts as open in every period between its first sighting and its
+    closing, or its last sighting while it is still open.
+
+    Parameters:
+    -----------
+    lifetimes : pd.DataFrame
+        Job lifetimes with 'first_seen', 'last_seen' and 'closed_at' columns, e.g.
+        pd.DataFrame(JobLifecycle().lifetimes('egypt'), columns=LIFETIME_COLUMNS).
+
+    plot_name : str
+        Name of the output image file (without extension).
+
+    folder : Literal['egypt', 'saudi', 'compare']
+        Folder name where the plot will be saved.
+
+    save : bool
+        Whether to save the output image file (default True).
+
+    freq : str, optional, default='D'
+        Period of the counts, e.g. 'D' for daily or 'W' for weekly.
+
+    Returns:
+    --------
+    fig : matplotlib.figure.Figure
+        The generated figure object for further use or customization.
+    """
+    first_seen = pd.to_datetime(lifetimes['first_seen'], errors='coerce')
+    closed_at = pd.to_datetime(lifetimes['closed_at'], errors='coerce')
+    end = closed_at.fillna(pd.to_datetime(lifetimes['last_seen'], errors='coerce'))
+    known = first_seen.notna() & end.notna()
+    first_seen, end, closed_at = first_seen[known], end[known], closed_at[known]
+
+    # Open jobs per period: +1 in the period a job is first seen, -1 in the period after it ends
+    periods = pd.period_range(first_seen.min(), end.max(), freq=freq)
+    starts = first_seen.dt.to_period(freq).value_counts()
+    ends = (end.dt.to_period(freq) + 1).value_counts()
+    open_jobs = starts.reindex(periods, fill_value=0).sub(ends.reindex(periods, fill_value=0)).cumsum()
+    closed_jobs = closed_at.dropna().dt.to_period(freq).value_counts().reindex(periods, fill_value=0)
+
+    # Plot
+    fig, ax = plt.subplots(figsize=(10, 6))
+    open_jobs.to_timestamp().plot(ax=ax, marker='o', linestyle='-', label='Open')
+    closed_jobs.to_timestamp().plot(ax=ax, marker='x', linestyle='--', label='Closed')
+    ax.set_title(f'Open and Closed Jobs Over Time {folder}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Jobs')
+    ax.legend()
+    plt.tight_layout()
+
+    if save:
+        folder_path = '../visualizations/' + folder
+        os.makedirs(folder_path, exist_ok=True)
+
+        path = folder_path + '/' + plot_name + '.png'
+        fig.savefig(path, bbox_inches='tight')
+
+    return fig
+
+
 def plot_job_postings_by_industry(df, plot_name, folder: Literal['egypt', 'saudi', 'compare'], save=True):
     """
     Plot the top 10 industries by number of job postings with support for Arabic text display.
@@ -0,0 +1,180 @@
+# Raw HTML archive of fetched pages
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from scripts.extractor import JOB_FIELDS, extract_job
+from scripts.sinks import CsvSink
+from scripts.utils import data_path, process_context
+
+ARCHIVE_DIR = data_path('archive')
+
+
+def _object_path(root, digest):
+    return os.path.join(root, 'objects', digest[:2], digest + '.html.gz')
+
+
+class PageArchive:
+    """
+    A compressed, content-addressed archive of fetched pages.
+
+    Each page body is gzipped once under `objects/` and named by its SHA-256 digest, so refetching an unchanged
+    page costs no extra space. Every fetch is logged in `index.db` with its URL, kind ('listing' or 'detail'),
+    country, listing page, digest and fetch timestamp, in fetch order.
+
+    Args:
+        root (str, optional): The archive directory. Defaults to ARCHIVE_DIR.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, kind TEXT, country TEXT, page INTEGER, '
+            'digest TEXT, size INTEGER, fetched_at TEXT)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_country_kind ON pages (country, kind)')
+        self.conn.commit()
+
+    def object_path(self, digest):
+        """
+        Returns the file holding the page with the given digest.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the page.
+
+        Returns:
+            str: The path of the gzipped page.
+        """
+        return _object_path(self.root, digest)
+
+    def put(self, url, content, kind, country, page=None):
+        """
+        Stores a fetched page and logs the fetch.
+
+        Args:
+            url (str): The URL the page was fetched from.
+            content (str): The page HTML.
+            kind (str): 'listing' or 'detail'.
+            country (str): The country slug being crawled.
+            page (int, optional): The listing page the fetch belongs to. Defaults to None.
+
+        Returns:
+            str: The digest of the page.
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with gzip.open(temporary, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+
+        with self._lock:
+            self.conn.execute(
+                'INSERT INTO pages (url, kind, country, page, digest, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, kind, country, page, digest, len(data), datetime.now().isoformat(timespec='seconds'))
+            )
+            self.conn.commit()
+        return digest
+
+    def get(self, digest):
+        """
+        Reads an archived page.
+
+        Args:
+            digest (str): The digest of the page.
+
+        Returns:
+            str: The page HTML.
+        """
+        with gzip.open(self.object_path(digest), 'rb') as file:
+            return file.read().decode('utf-8')
+
+    def latest(self, country, kind='detail'):
+        """
+        Lists the latest archived fetch of every URL of a country, in fetch order.
+
+        Args:
+            country (str): The country slug.
+            kind (str, optional): 'listing' or 'detail'. Defaults to 'detail'.
+
+        Returns:
+            list: (url, digest) pairs.
+        """
+        return self.conn.execute(
+            'SELECT url, digest FROM pages WHERE id IN '
+            '(SELECT MAX(id) FROM pages WHERE country = ? AND kind = ? GROUP BY url) ORDER BY id',
+            (country, kind)
+        ).fetchall()
+
+    def close(self):
+        """
+        Closes the index database.
+        """
+        self.conn.close()
+
+
+def _reparse_page(task):
+    root, url, digest, parser = task
+    with gzip.open(_object_path(root, digest), 'rb') as file:
+        return extract_job(file.read().decode('utf-8'), url, parser)
+
+
+def reparse(country, archive=None, output=None, parser='lxml', processes=None, chunk_size=500):
+    """
+    Rebuilds the raw CSV of a country from archived detail pages with the current extractor, without any network
+    traffic. Pages are parsed in parallel across processes and written in their original fetch order. The CSV is
+    written next to the output and only replaces it once complete.
+
+    Args:
+        country (str): The country slug.
+        archive (PageArchive, optional): The archive to read. Defaults to the archive in `data/archive`.
+        output (str, optional): The CSV file to write. Defaults to `data/<country>_raw.csv`.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        processes (int, optional): The number of parser processes. Defaults to the number of CPUs.
+        chunk_size (int, optional): The number of jobs written to the CSV at a time. Defaults to 500.
+
+    Returns:
+        int: The number of jobs written.
+
+    Raises:
+        ValueError: If the archive holds no detail page of the country (the output is not touched).
+    """
+    if archive is None:
+        archive = PageArchive()
+    if output is None:
+        output = data_path(f'{country}_raw.csv')
+
+    tasks = [(archive.root, url, digest, parser) for url, digest in archive.latest(country)]
+    if not tasks:
+        raise ValueError(f'No archived detail pages of {country} in {archive.root}; crawl with --archive first. '
+                         f'{output} was left untouched.')
+
+    partial_output = output + '.partial'
+    try:
+        with CsvSink(partial_output, JOB_FIELDS) as sink, \
+                ProcessPoolExecutor(processes, mp_context=process_context()) as executor:
+            jobs = []
+            for job in executor.map(_reparse_page, tasks, chunksize=64):
+                jobs.append(job)
+                if len(jobs) == chunk_size:
+                    sink.write(jobs)
+                    jobs = []
+            sink.write(jobs)
+        os.replace(partial_output, output)
+    finally:
+        if os.path.exists(partial_output):
+            os.remove(partial_output)
+    print(f"Reparsed {sink.rows} archived jobs of {country} into {output}")
+    return sink.rows
+
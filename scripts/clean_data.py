@@ -1,57 +1,131 @@
 # Data cleaning functions here
-from deep_translator import GoogleTranslator
-from langdetect import detect
+from langdetect import DetectorFactory, detect
 import numpy as np
 import pandas as pd
+import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from scripts.titles import TitleMapper, TitleStore
+from scripts.translation import TranslationService, translate_texts
+from scripts.utils import process_context
 
-def translate_if_arabic(text, no_detect=False):
+# Seeded once so langdetect gives the same answer for the same text on every run.
+DetectorFactory.seed = 0
+
+# Letters of the Arabic Unicode blocks (Arabic, Supplement, Extended-A, Presentation Forms A and B); digits,
+# punctuation and the tatweel are not counted.
+ARABIC_LETTERS = r'[\u0621-\u063A\u0641-\u064A\u066E-\u06D3\u06D5\u06EE\u06EF\u06FA-\u06FF' \
+                 r'\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFC]'
+LATIN_LETTERS = r'[A-Za-z\u00C0-\u024F]'
+
+
+def _is_arabic(text):
+    try:
+        return detect(text) == 'ar'
+    except:
+        return False
+
+
+def classify_script(values):
+    """
+    Classifies texts by the script of their letters: 'arabic' if all are Arabic, 'mixed' if some are, 'latin'
+    otherwise (including texts without letters).
+
+    Letters are counted per distinct value with vectorized string operations, so a column of thousands of titles
+    is classified in milliseconds, and the result is deterministic.
+
+    Args:
+        values (pd.Series): The texts; missing and non-string values are classified as 'latin'.
+
+    Returns:
+        pd.Series: The script of every value, aligned with `values`.
+    """
+    values = pd.Series(values)
+    unique = pd.Series(values.dropna().unique(), dtype=object)
+    unique = unique[unique.map(type) == str]
+    arabic = unique.str.count(ARABIC_LETTERS).to_numpy()
+    latin = unique.str.count(LATIN_LETTERS).to_numpy()
+    scripts = np.select([(arabic > 0) & (latin == 0), arabic > 0], ['arabic', 'mixed'], 'latin')
+    return values.map(dict(zip(unique, scripts.tolist()))).fillna('latin')
+
+
+def is_arabic(values, langdetect=False):
+    """
+    Tells which texts are Arabic, i.e. hold Arabic letters (see `classify_script`).
+
+    Args:
+        values (pd.Series): The texts.
+        langdetect (bool, optional): If True, the texts in Arabic script are also checked with langdetect (slow),
+            which tells Arabic from other languages written in it, such as Persian or Urdu. Defaults to False.
+
+    Returns:
+        pd.Series: A boolean mask aligned with `values`.
+    """
+    values = pd.Series(values)
+    mask = classify_script(values) != 'latin'
+    if langdetect:
+        detected = {text: _is_arabic(text) for text in values[mask].unique()}
+        mask &= values.map(detected).fillna(False).astype(bool)
+    return mask
+
+
+def translate_if_arabic(text, no_detect=False, cache=None, langdetect=False):
     """
     Translates the given text to English if it is in Arabic.
 
+    Translations go through a persistent cache (see `translation.translate_texts`), so a text is only sent to
+    Google Translate the first time it is seen.
+
     Args:
         text (str): The text to translate.
         no_detect (bool, optional): If True, skips language detection and always attempts to translate. Defaults to False.
+        cache (TranslationCache, optional): The translation cache. Defaults to the cache in `data/translations.db`.
+        langdetect (bool, optional): If True, also checks the language with langdetect (see `is_arabic`).
+            Defaults to False.
 
     Returns:
         str: The translated text (if Arabic) or the original text (if not Arabic or if translation fails).
     """
     if not text or not isinstance(text, str):
         return text
-
-    if not no_detect:
-        try:
-            lang = detect(text)
-            if lang == 'ar':
-                return GoogleTranslator(source='ar', target='en').translate(text)
-            else:
-                return text
-        except:
-            return text
-    else:
-        try:
-            return GoogleTranslator(source='ar', target='en').translate(text)
-        except:
-            return text
+    if not no_detect and not is_arabic([text], langdetect)[0]:
+        return text
+    return translate_texts([text], cache=cache)[text]
 
 
-def apply_translation(data, column, rows='all'):
+def apply_translation(data, column, rows='all', cache=None, service=None, langdetect=False):
     """
     Applies the translate_if_arabic function to a specified column in a DataFrame.
 
+    Arabic values are picked by their script (see `is_arabic`) and the distinct ones go through a TranslationService:
+    the job-title glossary first, then the cache, then batched concurrent calls to the translator; every row then
+    takes the translation of its value. With a `time_budget` on the service the whole column is translated in one
+    bounded pass, values left over keeping their text until the next run.
+
     Args:
         data (pd.DataFrame): The DataFrame containing the column to translate.
         column (str): The name of the column to translate.
         rows (str or list, optional):  Specifies which rows to translate.
             - 'all': Translate all rows in the column.
-            - list: A list of row indices to translate. Defaults to 'all'.
-    """
+            - list: A list of row indices to translate, without language detection. Defaults to 'all'.
+        cache (TranslationCache, optional): The translation cache. Defaults to the cache in `data/translations.db`.
+        service (TranslationService, optional): The translation service; its `counters` tell how many values each
+            tier translated. Defaults to a new service over `cache`.
+        langdetect (bool, optional): If True, also checks the language of the values with langdetect.
+            Defaults to False.
+    """
+    if service is None:
+        service = TranslationService(cache=cache)
+    values = data[column] if rows == 'all' else data.loc[rows, column]
+    texts = values[is_arabic(values, langdetect)] if rows == 'all' else values
+    texts = [text for text in texts.unique() if text and isinstance(text, str)]
+    translations = service.translate(texts)
+    translated = values.map(lambda text: translations.get(text, text) if isinstance(text, str) else text)
     if rows == 'all':
-        data[column] = data[column].apply(translate_if_arabic)
+        data[column] = translated
     else:
-        for row in rows:
-            data.at[row, column] = translate_if_arabic(data.at[row, column], no_detect=True)
+        data.loc[rows, column] = translated
 
 
 def split_column(df, column, index: list, split_char: str, names: list, fill_value='Unknown', reverse=False):
@@ -190,44 +264,84 @@ def analyses_date(df, num_days):
     df['date'] = reference_date - pd.to_timedelta(df['date'], unit='D')
 
 
-def extract_job_grade(df, column='title'):
+GRADE_NUMERALS = {'Graduate': 'i', 'Junior': 'ii', 'Mid Level': 'iii', 'Senior': 'iv',
+                  'Management': 'v', 'Senior Management': 'vi', 'C-Suite': 'vii'}
+GRADE_KEYWORDS = {
+    'Graduate': ['trainee', 'intern', 'entry-level', 'graduate', 'internship', 'interns', 'تمهير', 'تدريب'],
+    'Junior': ['junior'],
+    'Mid Level': ['mid-level', 'intermediate'],
+    'Senior': ['senior', 'supervisor', 'section head', r'(^sr(\b|\s)|\ssr(\b|\s))', 'senior associate'],
+    'Management': ['manager', 'principal', 'assistant director'],
+    'Senior Management': ['senior manager', 'director', 'vice president', 'svp', 'group manager'],
+    'C-Suite': ['c-suite', 'ceo', 'chief executive officer', 'cfo', 'chief financial officer',
+                'cio', 'chief information officer', 'coo', 'chief operating officer',
+                'cto', 'chief technology officer', 'cmo', 'chief marketing officer']
+}
+# The job type a grade implies; the other grades keep the type of the posting.
+GRADE_TYPES = {'Graduate': 'Intern', 'Management': 'Management', 'Senior Management': 'Management',
+               'C-Suite': 'Management'}
+
+
+def _grade_rules():
+    rules = [(key, rf'(\s|-){numeral}($|\s|\,|- )') for key, numeral in GRADE_NUMERALS.items()]
+    for key, keywords in GRADE_KEYWORDS.items():
+        regex = r'\b|'.join(keywords) + r'\b'
+        if key == 'Senior Management':
+            regex = r'(?<!\bassistant\s)\bdirector\b|' + r'\b|'.join(keywords[1:]) + r'\b'
+        rules.append((key, regex))
+    return rules
+
+
+# The grade rules in precedence order (a later match overrides an earlier one), each an optional lookahead from
+# the start of the title, so one match tells every rule that matches anywhere in it.
+GRADE_RULES = [key for key, _ in _grade_rules()]
+GRADE_PATTERN = re.compile(
+    ''.join(rf'(?=(?P<rule{number}>.*?(?:{regex}))?)' for number, (_, regex) in enumerate(_grade_rules())), re.S
+)
+
+
+def _job_grades(titles):
+    grades = []
+    for title in titles:
+        matched = [GRADE_RULES[int(name[4:])] for name, value in GRADE_PATTERN.match(title).groupdict().items()
+                   if value is not None]
+        types = [GRADE_TYPES[key] for key in matched if key in GRADE_TYPES]
+        grades.append((types[-1] if types else None, matched[-1] if matched else None))
+    return grades
+
+
+def extract_job_grade(df, column='title', processes=None, chunk_size=10000):
     """
     Extracts job grade information from a specified column (default: 'title') in a DataFrame.
 
+    All grade rules are matched in one pass per distinct title (see GRADE_PATTERN); when several match, the last
+    rule wins, the grade numerals first, then the keywords of GRADE_KEYWORDS in order. The grade goes to
+    'job_level' and, for graduate and management grades, the implied job type to 'type'.
+
     Args:
         df (pd.DataFrame): The DataFrame containing the job title column.
         column (str, optional): The name of the column containing job titles. Defaults to 'title'.
+        processes (int, optional): If more than 1, the distinct titles are matched in chunks by that many
+            processes, for large frames. Defaults to None (in this process).
+        chunk_size (int, optional): The number of distinct titles per chunk. Defaults to 10000.
     """
     df[column].fillna('Unknown', inplace=True)
 
-    mapping_dict0 = {'Graduate': 'i', 'Junior': 'ii', 'Mid Level': 'iii', 'Senior': 'iv',
-                     'Management': 'v', 'Senior Management': 'vi', 'C-Suite': 'vii'}
-    mapping_dict = {
-        'Graduate': ['trainee', 'intern', 'entry-level', 'graduate', 'internship', 'interns', 'تمهير', 'تدريب'],
-        'Junior': ['junior'],
-        'Mid Level': ['mid-level', 'intermediate'],
-        'Senior': ['senior', 'supervisor', 'section head', r'(^sr(\b|\s)|\ssr(\b|\s))', 'senior associate'],
-        'Management': ['manager', 'principal', 'assistant director'],
-        'Senior Management': ['senior manager', 'director', 'vice president', 'svp', 'group manager'],
-        'C-Suite': ['c-suite', 'ceo', 'chief executive officer', 'cfo', 'chief financial officer',
-                    'cio', 'chief information officer', 'coo', 'chief operating officer',
-                    'cto', 'chief technology officer', 'cmo', 'chief marketing officer']
-    }
-    list = [
-        mapping_dict0,
-        mapping_dict
-    ]
-    for i in [0, 1]:
-        for key in list[i]:
-            regex = r'\b|'.join(list[i][key]) + r'\b' if i else rf'(\s|-){list[i][key]}($|\s|\,|- )'
-            if key == 'Senior Management' and i:
-                regex = r'(?<!\bassistant\s)\bdirector\b|' + r'\b|'.join(list[i][key][1:]) + r'\b'
-            mask = df[column].str.contains(regex, regex=True)
-            if key == 'Graduate':
-                df.loc[mask, 'type'] = 'Intern'
-            if key == 'Management' or key == 'Senior Management' or key == 'C-Suite':
-                df.loc[mask, 'type'] = 'Management'
-            df.loc[mask, 'job_level'] = key
+    titles = df[column].unique()
+    if processes is not None and processes > 1 and len(titles) > chunk_size:
+        chunks = [titles[start:start + chunk_size] for start in range(0, len(titles), chunk_size)]
+        with ProcessPoolExecutor(processes, mp_context=process_context()) as executor:
+            grades = [grade for chunk in executor.map(_job_grades, chunks) for grade in chunk]
+    else:
+        grades = _job_grades(titles)
+
+    for target, position in (('type', 0), ('job_level', 1)):
+        values = df[column].map({title: grade[position] for title, grade in zip(titles, grades)
+                                 if grade[position] is not None})
+        if target in df:
+            df.loc[values.notna(), target] = values[values.notna()]
+        else:
+            df[target] = values
 
 
 def extract_gender(df, column):
@@ -357,20 +471,23 @@ def review_matches(df, title_mapping):
         print('#' * 120)
 
 
-def edit_title(df, title_mapping, patterns_replace=''):
+def edit_title(df, title_mapping, patterns_replace='', store=None, name=None):
     """
     Edits job titles in a DataFrame based on a provided mapping.
 
+    Patterns apply in order and later patterns see the replacements of earlier ones, so the last match wins. Each
+    distinct title is resolved once, trying only the patterns whose literals it contains (see `titles.TitleMapper`).
+    With a store, titles resolved by an earlier run are reused.
+
     Args:
         df (pd.DataFrame): The DataFrame containing the job titles.
         title_mapping (dict): A dictionary where keys are patterns to search for and values are the replacements.
+        patterns_replace (str, optional): A pattern removed from the titles before mapping. Defaults to ''.
+        store (TitleStore, optional): Where the mapped titles are kept between runs; after a mapping change only
+            the titles the changed patterns match are resolved again. Defaults to None (resolve every title).
+        name (str, optional): The name the mapping is stored under in `store` (e.g. 'egypt'). Defaults to None.
     """
-    df.title = df.title.str.lower().str.strip()
-
-    if patterns_replace:
-        df.title = df.title.str.replace(patterns_replace, '', regex=True).str.strip()
-
-    for pattern, replacement in title_mapping.items():
-        df.title[df.title.str.contains(pattern.lower(), regex=True)] = replacement.lower()
-
-    df.title = df.title.str.title()
+    if store is not None:
+        df.title = store.normalize(name, df.title, title_mapping, patterns_replace)
+    else:
+        df.title = TitleMapper(title_mapping, patterns_replace).normalize(df.title)
@@ -0,0 +1,278 @@
+# Crawl instrumentation for the scraper
+import json
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the histogram buckets; a final +Inf bucket is implied.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def page_kind(url):
+    """
+    Classifies a bayt.com URL as a listing page ('/jobs/?page=N') or a job detail page.
+
+    Args:
+        url (str): The requested URL.
+
+    Returns:
+        str: 'listing' or 'detail'.
+    """
+    return 'listing' if 'page=' in urlsplit(url).query else 'detail'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound if bound != float('inf') else self.buckets[-1]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {_format_bound(bound): total for bound, total in self.cumulative()},
+        }
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class CrawlMetrics:
+    """
+    Thread-safe counters and histograms describing where a crawl spends its time.
+
+    Requests are recorded by a ScraperSession created with `metrics=`, split by page kind: count per status,
+    latency histogram, wire bytes and retries. Crawl functions add the parse time of every page, the pages given up
+    on after all retries and, for every scraped job, which extracted fields came back empty, so a selector that
+    stopped matching shows up as a rising miss count instead of a silent column of None. A session with a rate
+    limiter also reports its current rate.
+
+    Args:
+        classify (callable, optional): Maps a requested URL to its page kind. Defaults to page_kind.
+    """
+
+    def __init__(self, classify=page_kind):
+        self.classify = classify
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._latency = {}
+        self._bytes = {}
+        self._retries = {}
+        self._failures = {}
+        self._failed_pages = {}
+        self._parse = {}
+        self._jobs = {}
+        self._misses = {}
+        self._rate = None
+
+    def observe_request(self, url, status, size, latency, attempt):
+        """
+        Records one request attempt.
+
+        Args:
+            url (str): The requested URL.
+            status (int or None): The response status code, or None if the request failed.
+            size (int): The bytes received on the wire.
+            latency (float): The request latency in seconds.
+            attempt (int): The zero-based attempt number; anything above 0 is a retry.
+        """
+        kind = self.classify(url)
+        with self._lock:
+            key = (kind, 'error' if status is None else str(status))
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+            self._latency.setdefault(kind, _Histogram(LATENCY_BUCKETS)).observe(latency)
+            self._bytes[kind] = self._bytes.get(kind, 0) + size
+            if attempt:
+                self._retries[kind] = self._retries.get(kind, 0) + 1
+            if status is None:
+                self._failures[kind] = self._failures.get(kind, 0) + 1
+
+    def observe_body(self, url, size):
+        """
+        Adds the wire bytes of a streamed body, read after its request was recorded.
+
+        Args:
+            url (str): The requested URL.
+            size (int): The bytes of the body received on the wire.
+        """
+        kind = self.classify(url)
+        with self._lock:
+            self._bytes[kind] = self._bytes.get(kind, 0) + size
+
+    def observe_failed_page(self, url):
+        """
+        Records a page given up on once its request failed after all retries.
+
+        Args:
+            url (str): The requested URL.
+        """
+        kind = self.classify(url)
+        with self._lock:
+            self._failed_pages[kind] = self._failed_pages.get(kind, 0) + 1
+
+    def observe_rate(self, rate):
+        """
+        Records the current rate of the session's adaptive limiter.
+
+        Args:
+            rate (float): The limiter rate in requests per second.
+        """
+        with self._lock:
+            self._rate = rate
+
+    def observe_parse(self, kind, seconds):
+        """
+        Records the time spent parsing one page.
+
+        Args:
+            kind (str): The page kind, e.g. 'listing' or 'detail'.
+            seconds (float): The parse time in seconds.
+        """
+        with self._lock:
+            self._parse.setdefault(kind, _Histogram(PARSE_BUCKETS)).observe(seconds)
+
+    def observe_jobs(self, kind, jobs, fields):
+        """
+        Records scraped jobs and counts the fields each one is missing.
+
+        Args:
+            kind (str): The record kind, 'detail' for detail pages or 'card' for listing cards.
+            jobs (list): The extracted job dicts.
+            fields (list): The fields the extractor is expected to fill.
+        """
+        with self._lock:
+            misses = self._misses.setdefault(kind, dict.fromkeys(fields, 0))
+            for job in jobs:
+                for field in fields:
+                    if job.get(field) is None:
+                        misses[field] = misses.get(field, 0) + 1
+            self._jobs[kind] = self._jobs.get(kind, 0) + len(jobs)
+
+    def summary(self):
+        """
+        Summarises the run so far.
+
+        Returns:
+            dict: Elapsed time, request and job throughput, and per-kind request, parse and field-miss statistics.
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            kinds = sorted(set(self._latency) | set(self._parse))
+            requests_total = sum(self._statuses.values())
+            jobs_total = sum(self._jobs.values())
+            return {
+                'elapsed_seconds': round(elapsed, 3),
+                'requests': requests_total,
+                'requests_per_second': round(requests_total / elapsed, 3) if elapsed else None,
+                'jobs': jobs_total,
+                'jobs_per_second': round(jobs_total / elapsed, 3) if elapsed else None,
+                'bytes': sum(self._bytes.values()),
+                'retries': sum(self._retries.values()),
+                'rate_limit_requests_per_second': round(self._rate, 3) if self._rate is not None else None,
+                'pages': {kind: {
+                    'statuses': {status: count for (k, status), count in sorted(self._statuses.items()) if k == kind},
+                    'bytes': self._bytes.get(kind, 0),
+                    'retries': self._retries.get(kind, 0),
+                    'failures': self._failures.get(kind, 0),
+                    'failed_pages': self._failed_pages.get(kind, 0),
+                    'latency_seconds': self._latency[kind].summary() if kind in self._latency else None,
+                    'parse_seconds': self._parse[kind].summary() if kind in self._parse else None,
+                } for kind in kinds},
+                'field_misses': {kind: {'jobs': self._jobs.get(kind, 0), 'misses': dict(misses)}
+                                 for kind, misses in sorted(self._misses.items())},
+            }
+
+    def prometheus(self):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+
+        def family(name, kind, description):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histograms(name, histograms_by_kind):
+            for kind, histogram in sorted(histograms_by_kind.items()):
+                for bound, total in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{kind="{_label(kind)}",le="{_format_bound(bound)}"}} {total}')
+                lines.append(f'{name}_sum{{kind="{_label(kind)}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{kind="{_label(kind)}"}} {histogram.count}')
+
+        with self._lock:
+            family('scraper_requests_total', 'counter', 'Request attempts by page kind and status.')
+            for (kind, status), count in sorted(self._statuses.items()):
+                lines.append(f'scraper_requests_total{{kind="{_label(kind)}",status="{status}"}} {count}')
+            family('scraper_request_retries_total', 'counter', 'Retried request attempts by page kind.')
+            for kind, count in sorted(self._retries.items()):
+                lines.append(f'scraper_request_retries_total{{kind="{_label(kind)}"}} {count}')
+            family('scraper_failed_pages_total', 'counter', 'Pages given up after all retries by page kind.')
+            for kind, count in sorted(self._failed_pages.items()):
+                lines.append(f'scraper_failed_pages_total{{kind="{_label(kind)}"}} {count}')
+            family('scraper_response_bytes_total', 'counter', 'Bytes received on the wire by page kind.')
+            for kind, count in sorted(self._bytes.items()):
+                lines.append(f'scraper_response_bytes_total{{kind="{_label(kind)}"}} {count}')
+            family('scraper_request_latency_seconds', 'histogram', 'Request latency by page kind.')
+            histograms('scraper_request_latency_seconds', self._latency)
+            family('scraper_parse_seconds', 'histogram', 'Parse time per page by page kind.')
+            histograms('scraper_parse_seconds', self._parse)
+            family('scraper_jobs_total', 'counter', 'Scraped jobs by record kind.')
+            for kind, count in sorted(self._jobs.items()):
+                lines.append(f'scraper_jobs_total{{kind="{_label(kind)}"}} {count}')
+            family('scraper_field_misses_total', 'counter', 'Scraped jobs missing a field, by record kind and field.')
+            for kind, misses in sorted(self._misses.items()):
+                for field, count in misses.items():
+                    lines.append(f'scraper_field_misses_total{{kind="{_label(kind)}",field="{_label(field)}"}} '
+                                 f'{count}')
+            if self._rate is not None:
+                family('scraper_rate_limit_requests_per_second', 'gauge',
+                       'Current rate of the adaptive request limiter.')
+                lines.append(f'scraper_rate_limit_requests_per_second {self._rate}')
+            family('scraper_elapsed_seconds', 'gauge', 'Seconds since the crawl started.')
+            lines.append(f'scraper_elapsed_seconds {time.monotonic() - self.started}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the JSON run summary to `<path>.json` and the Prometheus text to `<path>.prom`.
+
+        Args:
+            path (str): The output path without extension.
+        """
+        with open(path + '.json', 'w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, ensure_ascii=False, indent=2)
+        with open(path + '.prom', 'w', encoding='utf-8') as file:
+            file.write(self.prometheus())
@@ -0,0 +1,458 @@
+# Persistent crawl state for the scraper
+import json
+import re
+import sqlite3
+from datetime import datetime
+
+from scripts.utils import data_path
+
+STATE_DB = data_path('crawl_state.db')
+
+
+def job_id_from_link(link):
+    """
+    Extracts the bayt.com job ID from a job link (e.g. '/ar/egypt/jobs/accountant-5123456/' -> '5123456').
+
+    Args:
+        link (str): The job link, absolute or relative.
+
+    Returns:
+        str: The job ID, or the link path itself if it carries no numeric ID.
+    """
+    path = link.split('?')[0].rstrip('/')
+    match = re.search(r'-(\d+)$', path)
+    return match.group(1) if match else path
+
+
+class SeenJobs:
+    """
+    A persistent index of the job IDs that have already been scraped, stored in SQLite.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to STATE_DB.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS seen_jobs ('
+            'job_id TEXT PRIMARY KEY, country TEXT, link TEXT, scraped_at TEXT, first_scraped_at TEXT)'
+        )
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(seen_jobs)')}
+        if 'first_scraped_at' not in columns:
+            self.conn.execute('ALTER TABLE seen_jobs ADD COLUMN first_scraped_at TEXT')
+            self.conn.execute('UPDATE seen_jobs SET first_scraped_at = scraped_at')
+        self.conn.commit()
+
+    def known(self, job_ids):
+        """
+        Returns the subset of the given job IDs that are already in the index.
+
+        Args:
+            job_ids (list): The job IDs to look up.
+
+        Returns:
+            set: The job IDs that have been scraped before.
+        """
+        job_ids = list(job_ids)
+        found = set()
+        for i in range(0, len(job_ids), 500):
+            chunk = job_ids[i:i + 500]
+            rows = self.conn.execute(
+                f'SELECT job_id FROM seen_jobs WHERE job_id IN ({",".join("?" * len(chunk))})', chunk
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def scraped_at(self, job_ids):
+        """
+        Looks up when the given jobs were last scraped.
+
+        Args:
+            job_ids (list): The job IDs to look up.
+
+        Returns:
+            dict: The last scrape time of every known job ID, as a naive local datetime.
+        """
+        job_ids = list(job_ids)
+        times = {}
+        for i in range(0, len(job_ids), 500):
+            chunk = job_ids[i:i + 500]
+            rows = self.conn.execute(
+                f'SELECT job_id, scraped_at FROM seen_jobs WHERE job_id IN ({",".join("?" * len(chunk))})', chunk
+            )
+            times.update((job_id, datetime.fromisoformat(scraped_at)) for job_id, scraped_at in rows)
+        return times
+
+    def jobs(self, country):
+        """
+        Lists the scraped jobs of a country.
+
+        Args:
+            country (str): The country slug.
+
+        Returns:
+            list: (job_id, link, first_scraped_at, scraped_at) rows, the ISO times of the first and the last scrape.
+        """
+        return self.conn.execute(
+            'SELECT job_id, link, first_scraped_at, scraped_at FROM seen_jobs WHERE country = ?', (country,)
+        ).fetchall()
+
+    def add(self, country, jobs):
+        """
+        Records jobs as scraped now; jobs scraped before get their last scrape time updated, never the first.
+
+        Args:
+            country (str): The country slug the jobs were scraped from.
+            jobs (list): (job_id, link) pairs.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self.conn.executemany(
+            'INSERT INTO seen_jobs (job_id, country, link, scraped_at, first_scraped_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (job_id) DO UPDATE SET link = excluded.link, scraped_at = excluded.scraped_at',
+            [(job_id, country, link, now, now) for job_id, link in jobs]
+        )
+        self.conn.commit()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
+
+
+class Checkpoints:
+    """
+    Durable crawl checkpoints, one per country, stored in SQLite.
+
+    A checkpoint records the last listing page whose jobs are fully written, the detail links of later pages that
+    are discovered but not written yet, and the size of the output file at that point.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to STATE_DB.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'country TEXT PRIMARY KEY, last_page INTEGER, pending TEXT, output_size INTEGER, updated_at TEXT)'
+        )
+        self.conn.commit()
+
+    def save(self, country, last_page, pending, output_size):
+        """
+        Saves the checkpoint of a country, replacing the previous one.
+
+        Args:
+            country (str): The country slug being crawled.
+            last_page (int): The last listing page whose jobs are fully written.
+            pending (list): (page, links) pairs of discovered pages whose jobs are not written yet.
+            output_size (int): The size in bytes of the output file.
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO checkpoints (country, last_page, pending, output_size, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (country, last_page, json.dumps(pending), output_size, datetime.now().isoformat(timespec='seconds'))
+        )
+        self.conn.commit()
+
+    def load(self, country):
+        """
+        Loads the checkpoint of a country.
+
+        Args:
+            country (str): The country slug.
+
+        Returns:
+            dict or None: The checkpoint with 'last_page', 'pending' and 'output_size' keys, or None if there is none.
+        """
+        row = self.conn.execute(
+            'SELECT last_page, pending, output_size FROM checkpoints WHERE country = ?', (country,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'last_page': row[0], 'pending': json.loads(row[1]), 'output_size': row[2]}
+
+    def clear(self, country):
+        """
+        Removes the checkpoint of a country once its crawl has finished.
+
+        Args:
+            country (str): The country slug.
+        """
+        self.conn.execute('DELETE FROM checkpoints WHERE country = ?', (country,))
+        self.conn.commit()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
+
+
+class DetailQueue:
+    """
+    A persistent queue of job detail pages still to be fetched, stored in SQLite.
+
+    Fast crawls only read listing cards and leave the detail pages here to be back-filled later, highest priority
+    first (see `scheduler.detail_priority`).
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to STATE_DB.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS detail_queue ('
+            'link TEXT PRIMARY KEY, country TEXT, job_id TEXT, priority REAL, enqueued_at TEXT)'
+        )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS detail_queue_order ON detail_queue (country, priority DESC, enqueued_at)'
+        )
+        self.conn.commit()
+
+    def enqueue(self, country, links, priority=0):
+        """
+        Adds detail links to the queue. Links already queued keep their place but take the new priority.
+
+        Args:
+            country (str): The country slug the links belong to.
+            links (list): The detail links.
+            priority (float or list, optional): Higher priorities are fetched first; either one priority for all
+                links or one per link. Defaults to 0.
+        """
+        links = list(links)
+        priorities = priority if isinstance(priority, (list, tuple)) else [priority] * len(links)
+        now = datetime.now().isoformat(timespec='seconds')
+        self.conn.executemany(
+            'INSERT INTO detail_queue (link, country, job_id, priority, enqueued_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (link) DO UPDATE SET priority = excluded.priority',
+            [(link, country, job_id_from_link(link), link_priority, now)
+             for link, link_priority in zip(links, priorities)]
+        )
+        self.conn.commit()
+
+    def peek(self, country, limit=None):
+        """
+        Returns queued links of a country, highest priority and oldest first, without removing them.
+
+        Args:
+            country (str): The country slug.
+            limit (int, optional): The maximum number of links. Defaults to all.
+
+        Returns:
+            list: The queued detail links.
+        """
+        rows = self.conn.execute(
+            'SELECT link FROM detail_queue WHERE country = ? ORDER BY priority DESC, enqueued_at, rowid LIMIT ?',
+            (country, -1 if limit is None else limit)
+        )
+        return [row[0] for row in rows]
+
+    def remove(self, links):
+        """
+        Removes fetched links from the queue.
+
+        Args:
+            links (list): The detail links.
+        """
+        self.conn.executemany('DELETE FROM detail_queue WHERE link = ?', [(link,) for link in links])
+        self.conn.commit()
+
+    def count(self, country):
+        """
+        Counts the queued links of a country.
+
+        Args:
+            country (str): The country slug.
+
+        Returns:
+            int: The number of queued links.
+        """
+        return self.conn.execute('SELECT COUNT(*) FROM detail_queue WHERE country = ?', (country,)).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
+
+
+class Sitemaps:
+    """
+    The `lastmod` of every sitemap read by change discovery, stored per country in SQLite, so unchanged sitemaps are
+    skipped.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to STATE_DB.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sitemaps ('
+            'country TEXT, url TEXT, lastmod TEXT, read_at TEXT, PRIMARY KEY (country, url))'
+        )
+        self.conn.commit()
+
+    def lastmod(self, country, url):
+        """
+        Returns the `lastmod` a sitemap had when it was last read for a country.
+
+        Args:
+            country (str): The country slug.
+            url (str): The sitemap URL.
+
+        Returns:
+            str or None: The stored `lastmod`, or None if the sitemap was never read.
+        """
+        row = self.conn.execute(
+            'SELECT lastmod FROM sitemaps WHERE country = ? AND url = ?', (country, url)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, country, url, lastmod):
+        """
+        Records that a sitemap was read for a country.
+
+        Args:
+            country (str): The country slug.
+            url (str): The sitemap URL.
+            lastmod (str): The `lastmod` the sitemap index gave for it.
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO sitemaps (country, url, lastmod, read_at) VALUES (?, ?, ?, ?)',
+            (country, url, lastmod, datetime.now().isoformat(timespec='seconds'))
+        )
+        self.conn.commit()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
+
+
+# The columns of the rows returned by `JobLifecycle.lifetimes`.
+LIFETIME_COLUMNS = ['job_id', 'link', 'first_seen', 'last_seen', 'closed_at']
+
+
+class JobLifecycle:
+    """
+    When every tracked job was first seen, last seen open and closed, stored in SQLite.
+
+    Lifetimes are mirrored, in minutes since the epoch, into an R*Tree interval index that triggers keep in step,
+    so the jobs open at some point of a period are found without scanning the table. A job's known lifetime runs
+    from `first_seen` to `closed_at`, or to `last_seen` while it is open. The validators (ETag and Last-Modified)
+    of the last check are kept for conditional revisits.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to STATE_DB.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            'CREATE TABLE IF NOT EXISTS job_lifecycle ('
+            'id INTEGER PRIMARY KEY, job_id TEXT UNIQUE, country TEXT, link TEXT, first_seen TEXT, last_seen TEXT, '
+            'closed_at TEXT, checked_at TEXT, etag TEXT, last_modified TEXT);'
+            'CREATE INDEX IF NOT EXISTS job_lifecycle_due ON job_lifecycle (country, closed_at, checked_at);'
+            'CREATE VIRTUAL TABLE IF NOT EXISTS job_lifetimes USING rtree_i32(id, start, end);'
+            'CREATE TRIGGER IF NOT EXISTS job_lifetimes_insert AFTER INSERT ON job_lifecycle BEGIN '
+            "INSERT INTO job_lifetimes VALUES (new.id, strftime('%s', new.first_seen) / 60, "
+            "strftime('%s', coalesce(new.closed_at, new.last_seen)) / 60); END;"
+            'CREATE TRIGGER IF NOT EXISTS job_lifetimes_update '
+            'AFTER UPDATE OF first_seen, last_seen, closed_at ON job_lifecycle BEGIN '
+            "UPDATE job_lifetimes SET start = strftime('%s', new.first_seen) / 60, "
+            "end = strftime('%s', coalesce(new.closed_at, new.last_seen)) / 60 WHERE id = new.id; END;"
+        )
+        self.conn.commit()
+
+    def track(self, country, jobs):
+        """
+        Starts tracking scraped jobs, or moves `last_seen` forward for jobs tracked already. A closed job scraped
+        again after it closed is reopened.
+
+        Args:
+            country (str): The country slug.
+            jobs (list): (job_id, link, first_seen, last_seen) rows as returned by `SeenJobs.jobs`.
+        """
+        self.conn.executemany(
+            'INSERT INTO job_lifecycle (job_id, country, link, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (job_id) DO UPDATE SET link = excluded.link, '
+            'first_seen = min(first_seen, excluded.first_seen), last_seen = max(last_seen, excluded.last_seen), '
+            'closed_at = CASE WHEN excluded.last_seen > closed_at THEN NULL ELSE closed_at END',
+            [(job_id, country, link, first_seen, last_seen) for job_id, link, first_seen, last_seen in jobs]
+        )
+        self.conn.commit()
+
+    def due(self, country, limit=None):
+        """
+        Returns the open jobs of a country, the ones checked longest ago (or never) first.
+
+        Args:
+            country (str): The country slug.
+            limit (int, optional): The maximum number of jobs. Defaults to all.
+
+        Returns:
+            list: (job_id, link, etag, last_modified) rows.
+        """
+        return self.conn.execute(
+            'SELECT job_id, link, etag, last_modified FROM job_lifecycle WHERE country = ? AND closed_at IS NULL '
+            'ORDER BY checked_at IS NOT NULL, checked_at LIMIT ?',
+            (country, -1 if limit is None else limit)
+        ).fetchall()
+
+    def record(self, checks):
+        """
+        Records the outcome of revisits.
+
+        Args:
+            checks (list): (job_id, state, etag, last_modified) tuples where `state` is 'open' (the job still
+                exists: `last_seen` moves to now), 'closed' (the job is gone: `closed_at` is set, once) or 'failed'
+                (nothing was learned). New validators replace the stored ones; None keeps them.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self.conn.executemany(
+            'UPDATE job_lifecycle SET checked_at = :now, '
+            "last_seen = CASE WHEN :state = 'open' THEN :now ELSE last_seen END, "
+            "closed_at = CASE :state WHEN 'open' THEN NULL WHEN 'closed' THEN coalesce(closed_at, :now) "
+            'ELSE closed_at END, '
+            'etag = coalesce(:etag, etag), last_modified = coalesce(:last_modified, last_modified) '
+            'WHERE job_id = :job_id',
+            [{'now': now, 'job_id': job_id, 'state': state, 'etag': etag, 'last_modified': last_modified}
+             for job_id, state, etag, last_modified in checks]
+        )
+        self.conn.commit()
+
+    def lifetimes(self, country, start=None, end=None):
+        """
+        Returns the tracked jobs of a country, optionally only those open at some point between two times.
+
+        Args:
+            country (str): The country slug.
+            start (str, optional): The ISO start of the period. Defaults to None (no period).
+            end (str, optional): The ISO end of the period. Defaults to `start`.
+
+        Returns:
+            list: Rows of LIFETIME_COLUMNS, ordered by `first_seen`.
+        """
+        columns = 'l.job_id, l.link, l.first_seen, l.last_seen, l.closed_at'
+        if start is None:
+            return self.conn.execute(
+                f'SELECT {columns} FROM job_lifecycle l WHERE country = ? ORDER BY first_seen', (country,)
+            ).fetchall()
+        return self.conn.execute(
+            f'SELECT {columns} FROM job_lifetimes t JOIN job_lifecycle l ON l.id = t.id '
+            "WHERE t.start <= strftime('%s', :end) / 60 AND t.end >= strftime('%s', :start) / 60 "
+            'AND l.country = :country ORDER BY l.first_seen',
+            {'country': country, 'start': start, 'end': start if end is None else end}
+        ).fetchall()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
@@ -0,0 +1,264 @@
+# Near-duplicate detection for job postings
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+# The fields two postings of the same vacancy share, even when reposted by another recruiter.
+DEDUP_COLUMNS = ['title', 'company_name', 'city', 'description']
+
+# Arabic diacritics and tatweel are dropped; alef, yaa and taa marbuta variants are unified. Chained str.replace
+# calls are several times faster than str.translate on Arabic text.
+_ARABIC_FOLDING = [(chr(code), '') for code in [*range(0x064B, 0x0653), 0x0670, 0x0640]] + \
+    [('إ', 'ا'), ('أ', 'ا'), ('آ', 'ا'), ('ى', 'ي'), ('ة', 'ه')]
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_EMPTY = np.iinfo(np.uint64).max
+
+
+def fold_text(text):
+    """
+    Folds a text for matching: lower-cased, Arabic diacritics and tatweel removed, and alef, yaa and taa marbuta
+    variants unified.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The folded text.
+    """
+    text = text.lower()
+    for old, new in _ARABIC_FOLDING:
+        text = text.replace(old, new)
+    return text
+
+
+def _words(series):
+    return series.fillna('').astype(str).map(fold_text).str.findall(r'[^\W_]+')
+
+
+def normalize_text(series):
+    """
+    Normalizes a text column for duplicate matching: lower-cased, Arabic diacritics and tatweel removed, alef,
+    yaa and taa marbuta variants unified, and punctuation collapsed to single spaces.
+
+    Args:
+        series (pd.Series): The text column.
+
+    Returns:
+        pd.Series: The normalized text, with missing values as empty strings.
+    """
+    return _words(series).str.join(' ')
+
+
+def _shingle_hashes(word_lists, shingle_size, salt):
+    # Hashes every word once, then folds each run of `shingle_size` consecutive words of a posting into one
+    # shingle hash with numpy; postings shorter than a shingle give one shingle of all their words.
+    lengths = np.fromiter(map(len, word_lists), dtype=np.int64, count=len(word_lists))
+    words = pd.util.hash_array(np.fromiter(chain.from_iterable(word_lists), dtype=object, count=int(lengths.sum())))
+    posting = np.repeat(np.arange(len(word_lists)), lengths)
+    position = np.arange(len(words)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    hashes = words ^ np.uint64(salt * int(_MIX) % 2 ** 64)
+    with np.errstate(over='ignore'):
+        for offset in range(1, shingle_size):
+            following = np.zeros_like(words)
+            following[:-offset] = words[offset:]
+            same = np.zeros(len(words), dtype=bool)
+            same[:-offset] = posting[offset:] == posting[:-offset]
+            hashes = hashes * _MIX + np.where(same, following, np.uint64(0))
+    keep = position <= np.maximum(lengths - shingle_size, 0)[posting]
+    return hashes[keep], posting[keep]
+
+
+def _densify(signatures, offset):
+    # Rotation densification: an empty bin takes the value of the next non-empty bin to its right (wrapping
+    # around), shifted by `offset` per bin skipped, so the signatures of two similar postings still agree there.
+    num_perm = signatures.shape[1]
+    doubled = np.concatenate([signatures, signatures], axis=1)
+    filled = np.where(doubled != _EMPTY, np.arange(2 * num_perm), 2 * num_perm)
+    source = np.minimum.accumulate(filled[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+    source = np.minimum(source, 2 * num_perm - 1)
+    distance = (source - np.arange(num_perm)).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return np.take_along_axis(doubled, source, axis=1) + distance * offset
+
+
+def minhash_signatures(df, columns=DEDUP_COLUMNS, num_perm=128, shingle_size=3, seed=1, max_tokens=2 ** 20):
+    """
+    Computes a MinHash signature per posting over the shingles of its normalized fields.
+
+    Every field but the last contributes its words (tagged with the field, so a city never matches a title word)
+    and the last field, the description, contributes overlapping word `shingle_size`-grams. Words are hashed with
+    pandas' vectorized hashing and shingles are folded from word hashes in numpy. Signatures use one-permutation
+    hashing: a single seeded hash splits each posting's shingles into `num_perm` bins and keeps the minimum of
+    each bin, so the cost grows with the number of shingles rather than shingles times `num_perm`. Bins left
+    empty by short postings are filled by rotation densification.
+
+    Args:
+        df (pd.DataFrame): The postings.
+        columns (list, optional): The fields to hash; the last one is treated as the description.
+            Defaults to DEDUP_COLUMNS.
+        num_perm (int, optional): The signature length. Defaults to 128.
+        shingle_size (int, optional): The number of words per description shingle. Defaults to 3.
+        seed (int, optional): The seed of the hash function. Defaults to 1.
+        max_tokens (int, optional): The number of postings hashed at a time is chosen so that about this many words
+            are in memory at once. Defaults to 1048576.
+
+    Returns:
+        tuple: (signatures, empty) where `signatures` is a (len(df), num_perm) uint64 array and `empty` marks
+            postings without any text, which never match.
+    """
+    words = [_words(df[column]).tolist() for column in columns]
+    shingle_sizes = [1] * (len(columns) - 1) + [shingle_size]
+    lengths = sum(np.fromiter(map(len, field), dtype=np.int64, count=len(df)) for field in words)
+
+    multiplier, increment, offset = np.random.default_rng(seed).integers(1, 2 ** 63, 3, dtype=np.uint64)
+    multiplier |= np.uint64(1)
+    bins = np.full(len(df) * num_perm, _EMPTY, dtype=np.uint64)
+
+    batch_ends = np.searchsorted(np.cumsum(lengths), np.arange(max_tokens, int(lengths.sum()), max_tokens))
+    start = 0
+    for end in np.unique(np.r_[batch_ends, len(df)]):
+        if end == start:
+            continue
+        for salt, (field, size) in enumerate(zip(words, shingle_sizes)):
+            hashes, postings = _shingle_hashes(field[start:end], size, salt)
+            with np.errstate(over='ignore'):
+                hashes = hashes * multiplier + increment
+            np.minimum.at(bins, (start + postings) * num_perm + (hashes % np.uint64(num_perm)).astype(np.int64),
+                          hashes // np.uint64(num_perm))
+        start = end
+
+    empty = lengths == 0
+    signatures = bins.reshape(len(df), num_perm)
+    signatures[~empty] = _densify(signatures[~empty], offset)
+    return signatures, empty
+
+
+def _lsh_bands(num_perm, threshold):
+    # The (bands, rows) split whose S-curve midpoint (1/bands)^(1/rows) is the highest one not above the threshold,
+    # favouring recall; candidates are verified against the threshold afterwards.
+    splits = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1])) if below else splits[-1]
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_groups(signatures, empty, threshold=0.8):
+    """
+    Groups postings whose estimated Jaccard similarity reaches the threshold, using locality-sensitive hashing.
+
+    Signatures are cut into bands; postings sharing a band land in the same bucket and each is compared with the
+    first posting of the bucket only, so the work grows with the number of postings, not with the number of pairs.
+    Matches are merged transitively with union-find.
+
+    Args:
+        signatures (np.ndarray): The MinHash signatures from `minhash_signatures`.
+        empty (np.ndarray): The postings without text; they are never grouped.
+        threshold (float, optional): The minimum estimated Jaccard similarity of a duplicate. Defaults to 0.8.
+
+    Returns:
+        np.ndarray: For every posting, the position of the first posting of its group (itself if it is unique).
+    """
+    count, num_perm = signatures.shape
+    bands, rows = _lsh_bands(num_perm, threshold)
+    parent = list(range(count))
+    candidates = np.flatnonzero(~empty)
+
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[candidates, band * rows:(band + 1) * rows])
+        _, buckets = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel(),
+                               return_inverse=True)
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        leaders = candidates[order[starts[np.searchsorted(starts, np.arange(len(order)), side='right') - 1]]]
+        members = candidates[order]
+        pairs = members != leaders
+        if not pairs.any():
+            continue
+        members, leaders = members[pairs], leaders[pairs]
+        similar = (signatures[members] == signatures[leaders]).mean(axis=1) >= threshold
+        for member, leader in zip(members[similar].tolist(), leaders[similar].tolist()):
+            member, leader = _find(parent, member), _find(parent, leader)
+            if member != leader:
+                parent[max(member, leader)] = min(member, leader)
+
+    return np.array([_find(parent, i) for i in range(count)], dtype=np.int64)
+
+
+def flag_near_duplicates(df, columns=DEDUP_COLUMNS, threshold=0.8, num_perm=128, shingle_size=3, seed=1):
+    """
+    Flags postings that are near-duplicates of an earlier posting, e.g. one vacancy reposted under a slightly
+    different title or cross-posted by several recruiters.
+
+    Postings are compared by the MinHash of their normalized fields and matched with LSH, in time linear in the
+    number of postings. The first posting of each group (in DataFrame order) is kept as the original.
+
+    Adds two columns to the DataFrame:
+        - 'duplicate_of': The index label of the original posting of the group (the posting's own label if unique).
+        - 'is_duplicate': True for every posting of a group but the original.
+
+    Args:
+        df (pd.DataFrame): The postings.
+        columns (list, optional): The fields compared; the last one is treated as the description.
+            Defaults to DEDUP_COLUMNS.
+        threshold (float, optional): The minimum estimated Jaccard similarity of a duplicate. Defaults to 0.8.
+        num_perm (int, optional): The MinHash signature length; longer is more accurate and slower. Defaults to 128.
+        shingle_size (int, optional): The number of words per description shingle. Defaults to 3.
+        seed (int, optional): The seed of the hash functions. Defaults to 1.
+    """
+    signatures, empty = minhash_signatures(df, columns, num_perm, shingle_size, seed)
+    groups = near_duplicate_groups(signatures, empty, threshold)
+    df['duplicate_of'] = df.index[groups]
+    df['is_duplicate'] = groups != np.arange(len(df))
+
+
+def latest_per_link(df, column='link'):
+    """
+    Keeps the last row of every job link. A raw CSV is appended to, so a job fetched again (e.g. its detail page
+    changed, see `sitemap.discover_changes`, or was back-filled after a card-only crawl) has its newest row last.
+
+    Args:
+        df (pd.DataFrame): The postings.
+        column (str, optional): The link column; if the DataFrame has none it is returned as is. Defaults to 'link'.
+
+    Returns:
+        pd.DataFrame: The postings with one row per link (rows without a link are all kept).
+    """
+    if column not in df:
+        return df
+    return df[~df[column].duplicated(keep='last') | df[column].isna()]
+
+
+def drop_near_duplicates(df, columns=DEDUP_COLUMNS, threshold=0.8, num_perm=128, shingle_size=3, seed=1):
+    """
+    Collapses near-duplicate postings to the first posting of each group. See `flag_near_duplicates`.
+
+    Rows of the same link are first reduced to the newest one (see `latest_per_link`), so a refetched job replaces
+    its stale copy instead of being collapsed into it.
+
+    Args:
+        df (pd.DataFrame): The postings.
+        columns (list, optional): The fields compared. Defaults to DEDUP_COLUMNS.
+        threshold (float, optional): The minimum estimated Jaccard similarity of a duplicate. Defaults to 0.8.
+        num_perm (int, optional): The MinHash signature length. Defaults to 128.
+        shingle_size (int, optional): The number of words per description shingle. Defaults to 3.
+        seed (int, optional): The seed of the hash functions. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: The postings without duplicates, with a 'duplicates' column counting the copies collapsed
+            into each.
+    """
+    flagged = latest_per_link(df).copy()
+    flag_near_duplicates(flagged, columns, threshold, num_perm, shingle_size, seed)
+    copies = flagged.loc[flagged['is_duplicate'], 'duplicate_of'].value_counts()
+    unique = flagged[~flagged['is_duplicate']].drop(columns=['duplicate_of', 'is_duplicate'])
+    unique['duplicates'] = unique.index.map(copies).fillna(0).astype(int)
+    return unique
@@ -0,0 +1,304 @@
+# Field extraction for bayt.com pages
+import time
+
+from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+# One row per field of a job detail page: (field, tag, attribute, value, follow). The field is the text of the
+# first `tag` whose `attribute` equals `value` (for 'class', as BeautifulSoup matches it). When `follow` lists
+# tags, the text is taken from the element reached by stepping to the next tag of each kind in document order.
+DETAIL_FIELDS = [
+    ('title', 'h1', 'id', 'job_title', ()),
+    ('company_name', 'a', 'class', 't-default t-bold', ()),
+    ('date', 'span', 'id', 'jb-posted-date', ()),
+    ('salary', 'div', 'data-automation-id', 'id_salary_range', ()),
+    ('career_level', 'div', 'data-automation-id', 'id_type_level_experience', ()),
+    ('location', 'span', 'class', 't-mute', ()),
+    ('num_of_vacancies', 'div', 'data-automation-id', 'id_number_of_vacancies', ()),
+    ('industry', 'div', 'data-automation-id', 'id_company_employees_industry', ()),
+    ('description', 'div', 'class', 'card-content p20t is-spaced', ('h2', 'div')),
+    ('skills', 'div', 'class', 'card-content is-spaced t-break print-break-before p20t', ()),
+    ('remote', 'div', 'data-automation-id', 'id_remote_working', ()),
+    ('num_of_exp', 'div', 'data-automation-id', 'data_عدد_سنوات_الخبرة', ()),
+    ('residence_area', 'div', 'data-automation-id', 'data_منطقة_الإقامة', ()),
+    ('nationality', 'div', 'data-automation-id', 'data_الجنسية', ()),
+    ('sex', 'div', 'data-automation-id', 'data_الجنس', ()),
+    ('qualification', 'div', 'data-automation-id', 'data_الشهادة', ()),
+    ('age', 'div', 'data-automation-id', 'data_العمر', ()),
+    ('specialization', 'div', 'data-automation-id', 'data_التخصص', ()),
+    ('experience', 'div', 'data-automation-id', 'data__المستوى_المهني', ()),
+]
+
+# The fields a job card of a listing page (`li.has-pointer-d`) carries, in the same format as DETAIL_FIELDS.
+CARD_FIELDS = [
+    ('title', 'a', 'data-js-aid', 'jobID', ()),
+    ('company_name', 'div', 'class', 'jb-company', ()),
+    ('location', 'div', 'class', 'jb-loc', ()),
+    ('date', 'div', 'class', 'jb-date', ()),
+]
+
+# The element (tag, attribute, value) after which a job detail page carries no field: a streamed page is complete
+# once it is reached, the fields not found by then are missing. An attribute of None matches the tag alone.
+DETAIL_END = ('footer', None, None)
+
+JOB_FIELDS = ['link'] + [spec[0] for spec in DETAIL_FIELDS]
+
+# Columns of a fast (card-only) crawl: the raw CSV columns plus whether the detail page was fetched.
+CARD_COLUMNS = JOB_FIELDS + ['detail_fetched']
+
+PARSERS = ('lxml', 'html5lib')
+
+
+def _index_by_tag(specs):
+    index = {}
+    for position, spec in enumerate(specs):
+        index.setdefault(spec[1], []).append(position)
+    return index
+
+
+_DETAIL_INDEX = _index_by_tag(DETAIL_FIELDS)
+_CARD_INDEX = _index_by_tag(CARD_FIELDS)
+
+
+def _attribute_matches(element, attribute, value):
+    actual = element.get(attribute)
+    if actual is None:
+        return False
+    if attribute == 'class':
+        classes = actual.split()
+        return value in classes or ' '.join(classes) == value
+    return actual == value
+
+
+def _parse_tree(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding='utf-8', remove_comments=True))
+
+
+class _FieldMatcher:
+    # Resolves field specs against elements visited in document order; `visit` returns the number of fields still
+    # unresolved. Shared by the whole-page walk and the streamed extractor.
+    def __init__(self, specs, index):
+        self.specs = specs
+        self.index = index
+        self.found = [None] * len(specs)
+        self.following = {}
+        self.remaining = len(specs)
+
+    def visit(self, element):
+        tag = element.tag
+        if not isinstance(tag, str):
+            return self.remaining
+        specs, found, following = self.specs, self.found, self.following
+
+        for position, step in list(following.items()):
+            follow = specs[position][4]
+            if tag == follow[step]:
+                if step + 1 == len(follow):
+                    found[position] = element
+                    del following[position]
+                    self.remaining -= 1
+                else:
+                    following[position] = step + 1
+
+        for position in self.index.get(tag, ()):
+            field, _, attribute, value, follow = specs[position]
+            if found[position] is not None or position in following or \
+                    not _attribute_matches(element, attribute, value):
+                continue
+            if follow:
+                following[position] = 0
+            else:
+                found[position] = element
+                self.remaining -= 1
+        return self.remaining
+
+    def values(self):
+        return [element.text_content().strip() if element is not None else None for element in self.found]
+
+
+def _match_fields(root, specs, index):
+    matcher = _FieldMatcher(specs, index)
+    for element in root.iter():
+        if not matcher.visit(element):
+            break
+    return matcher.values()
+
+
+def _extract_with_lxml(content):
+    root = _parse_tree(content)
+    body = root.find('body')
+    return _match_fields(root if body is None else body, DETAIL_FIELDS, _DETAIL_INDEX)
+
+
+def _extract_with_soup(content, parser):
+    job_soup = BeautifulSoup(content, parser)
+    values = []
+    for field, tag, attribute, value, follow in DETAIL_FIELDS:
+        element = job_soup.find(tag, {attribute: value})
+        for next_tag in follow:
+            element = element.find_next(next_tag) if element else None
+        values.append(element.text.strip() if element else None)
+    return values
+
+
+def extract_job(content, link, parser='lxml'):
+    """
+    Extracts the job fields declared in DETAIL_FIELDS from the HTML of a job detail page.
+
+    With the default 'lxml' parser every field is resolved in a single walk over the page body that ends as soon as
+    all fields are found. Passing 'html5lib' runs the original BeautifulSoup lookups, one `find` per field.
+
+    Args:
+        content (str): The HTML of the job detail page.
+        link (str): The URL of the job detail page.
+        parser (str, optional): 'lxml' or 'html5lib'. Defaults to 'lxml'.
+
+    Returns:
+        dict: The extracted job fields, keyed as JOB_FIELDS.
+    """
+    if parser == 'lxml':
+        values = _extract_with_lxml(content)
+    elif parser in PARSERS:
+        values = _extract_with_soup(content, parser)
+    else:
+        raise ValueError(f"Unknown parser {parser!r}, expected one of {PARSERS}")
+    return dict(zip(JOB_FIELDS, [link] + values))
+
+
+def extract_links(html, base_url, parser='lxml'):
+    """
+    Extracts the job detail links from the job cards of a listing page.
+
+    Args:
+        html (str): The HTML of the listing page.
+        base_url (str): The site root the relative links are joined to.
+        parser (str, optional): 'lxml' or 'html5lib'. Defaults to 'lxml'.
+
+    Returns:
+        list: The absolute detail links, in page order.
+    """
+    if parser == 'lxml':
+        cards = [card for card in _parse_tree(html).iter('li') if _attribute_matches(card, 'class', 'has-pointer-d')]
+        link_tags = [next((a for a in card.iter('a') if a.get('data-js-aid') == 'jobID'), None) for card in cards]
+    elif parser in PARSERS:
+        cards = BeautifulSoup(html, parser).find_all('li', class_='has-pointer-d')
+        link_tags = [card.find('a', {'data-js-aid': 'jobID'}) for card in cards]
+    else:
+        raise ValueError(f"Unknown parser {parser!r}, expected one of {PARSERS}")
+
+    links = []
+    for link_tag in link_tags:
+        if link_tag is None or not link_tag.get('href'):
+            print("Link not found")
+            continue
+        links.append(base_url + link_tag.get('href'))
+    return links
+
+
+def extract_cards(html, base_url):
+    """
+    Extracts the fields declared in CARD_FIELDS from the job cards of a listing page, without fetching any
+    detail page. Fields a card does not carry are left as None and `detail_fetched` is False.
+
+    Args:
+        html (str): The HTML of the listing page.
+        base_url (str): The site root the relative links are joined to.
+
+    Returns:
+        list: One dict per card with a detail link, keyed as CARD_COLUMNS.
+    """
+    jobs = []
+    for card in _parse_tree(html).iter('li'):
+        if not _attribute_matches(card, 'class', 'has-pointer-d'):
+            continue
+        link_tag = next((a for a in card.iter('a') if a.get('data-js-aid') == 'jobID'), None)
+        if link_tag is None or not link_tag.get('href'):
+            print("Link not found")
+            continue
+
+        job = dict.fromkeys(CARD_COLUMNS)
+        job.update(zip([spec[0] for spec in CARD_FIELDS], _match_fields(card, CARD_FIELDS, _CARD_INDEX)))
+        job['link'] = base_url + link_tag.get('href')
+        job['detail_fetched'] = False
+        jobs.append(job)
+    return jobs
+
+
+class DetailStream:
+    """
+    Extracts the DETAIL_FIELDS of a job detail page while it downloads.
+
+    Chunks of the page are fed to an incremental lxml parser and matched as their elements open, with the same
+    single-pass matching as `extract_job`. `feed` returns True once every field is found and its element closed,
+    or once the page reaches `end`, after which no field is expected, so the caller can stop the download there:
+    the scripts and footer markup at the bottom of a page are neither downloaded nor parsed. `seconds` sums the
+    time spent parsing.
+
+    Args:
+        link (str): The URL of the job detail page.
+        end (tuple, optional): The (tag, attribute, value) of the element ending the fields. Defaults to DETAIL_END.
+    """
+
+    def __init__(self, link, end=DETAIL_END):
+        self.link = link
+        self.end = end
+        self.done = False
+        self.seconds = 0.0
+        self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8', remove_comments=True)
+        self._parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        self._matcher = _FieldMatcher(DETAIL_FIELDS, _DETAIL_INDEX)
+        self._open = []
+        self._in_body = False
+
+    def feed(self, chunk):
+        """
+        Parses the next chunk of the page.
+
+        Args:
+            chunk (bytes): The next bytes of the page, UTF-8 encoded.
+
+        Returns:
+            bool: True once the fields are complete and the rest of the page is not needed.
+        """
+        if not self.done:
+            start = time.perf_counter()
+            self._parser.feed(chunk)
+            self._read_events()
+            self.seconds += time.perf_counter() - start
+        return self.done
+
+    def job(self):
+        """
+        Finishes parsing and returns the extracted fields.
+
+        Returns:
+            dict: The extracted job fields, keyed as JOB_FIELDS.
+        """
+        if not self.done:
+            start = time.perf_counter()
+            self._parser.close()
+            self._read_events()
+            self.done = True
+            self.seconds += time.perf_counter() - start
+        return dict(zip(JOB_FIELDS, [self.link] + self._matcher.values()))
+
+    def _read_events(self):
+        tag, attribute, value = self.end
+        for event, element in self._parser.read_events():
+            if event == 'end':
+                if self._open:
+                    self._open = [opened for opened in self._open if opened is not element]
+                    self.done = not self._open and not self._matcher.remaining
+            elif not self._in_body:
+                self._in_body = element.tag == 'body'
+            elif element.tag == tag and (attribute is None or _attribute_matches(element, attribute, value)):
+                self.done = True
+            else:
+                remaining = self._matcher.remaining
+                if self._matcher.visit(element) < remaining:
+                    self._open.append(element)
+            if self.done:
+                return
@@ -0,0 +1,322 @@
+# Network helpers for the scraper
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter that adapts its rate with AIMD.
+
+    Every request takes a token; tokens refill at `rate` per second up to `burst`. After each response the rate
+    is adjusted: a 429, a 5xx, a failed request or a latency well above the best seen so far cuts it
+    multiplicatively (at most once per `cooldown` seconds, so one slow spell counts once), while healthy responses
+    raise it additively. The current rate is exposed as `rate` and the number of cuts as `decreases`.
+
+    Args:
+        rate (float, optional): The initial rate in requests per second. Defaults to 5.
+        burst (float, optional): The bucket capacity. Defaults to 5.
+        min_rate (float, optional): The lowest rate the limiter backs off to. Defaults to 0.5.
+        max_rate (float, optional): The highest rate the limiter ramps up to. Defaults to 50.
+        increase (float, optional): The rate added per healthy response. Defaults to 0.05.
+        decrease (float, optional): The factor the rate is multiplied by on back-off. Defaults to 0.5.
+        latency_factor (float, optional): A response slower than this many times the baseline latency counts as
+            congestion. Defaults to 3.
+        cooldown (float, optional): The minimum number of seconds between two back-offs. Defaults to 1.
+    """
+
+    def __init__(self, rate=5.0, burst=5.0, min_rate=0.5, max_rate=50.0, increase=0.05, decrease=0.5,
+                 latency_factor=3.0, cooldown=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.decreases = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._latency = None
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    def feedback(self, status, latency):
+        """
+        Adapts the rate to the outcome of a request.
+
+        Args:
+            status (int or None): The response status code, or None if the request failed.
+            latency (float): The request latency in seconds.
+        """
+        with self._lock:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._baseline is None or self._latency < self._baseline:
+                self._baseline = self._latency
+
+            congested = status is None or status == 429 or status >= 500 or \
+                self._latency > self.latency_factor * self._baseline
+            now = time.monotonic()
+            if congested:
+                if now - self._last_decrease >= self.cooldown:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class ScraperSession:
+    """
+    A pooled HTTP session shared by all scraper requests.
+
+    Connections are kept alive and pooled per host, responses are requested compressed, every
+    request runs under connect/read timeouts, and transient failures (connection errors, timeouts
+    and 429/5xx responses) are retried with jittered exponential backoff. Each attempt is recorded
+    in `log` with its status, wire bytes and latency. If a limiter is given, every attempt takes a token from it
+    and reports its outcome back; if metrics are given, every attempt (and the limiter's rate after it) is recorded
+    in them too.
+
+    Args:
+        pool_size (int, optional): The number of pooled connections kept per host. Defaults to 16.
+        connect_timeout (float, optional): Seconds to wait for a connection. Defaults to 5.
+        read_timeout (float, optional): Seconds to wait between bytes of the response. Defaults to 30.
+        max_retries (int, optional): The number of retries after the first attempt. Defaults to 4.
+        backoff (float, optional): The base backoff delay in seconds. Defaults to 0.5.
+        max_backoff (float, optional): The upper bound of a single backoff delay in seconds. Defaults to 30.
+        limiter (TokenBucket, optional): The rate limiter shared by all requests. Defaults to None (no limit).
+        metrics (CrawlMetrics, optional): The crawl metrics the requests are recorded in. Defaults to None.
+    """
+
+    def __init__(self, pool_size=16, connect_timeout=5, read_timeout=30, max_retries=4, backoff=0.5,
+                 max_backoff=30, limiter=None, metrics=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        self.metrics = metrics
+        self.log = []
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    def backoff_delay(self, attempt, response=None):
+        """
+        Computes how long to wait before retrying, honouring a numeric Retry-After header.
+
+        Args:
+            attempt (int): The zero-based number of the attempt that failed.
+            response (requests.Response, optional): The failed response, if any. Defaults to None.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        return delay
+
+    def get(self, url, **kwargs):
+        """
+        Sends a GET request, retrying transient failures.
+
+        Args:
+            url (str): The URL to request.
+            **kwargs: Extra arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The final response.
+
+        Raises:
+            requests.RequestException: If the request still fails after all retries.
+        """
+        return self._send(url, **kwargs)[0]
+
+    def stream(self, url, feed, chunk_size=16384):
+        """
+        Downloads a page in chunks and stops as soon as `feed` has what it needs.
+
+        Each decoded chunk of the body is passed to `feed`; once it returns True the connection is closed without
+        reading the rest. A connection closed early cannot be reused, so this pays off on pages much larger than
+        the part that is needed. The wire bytes actually read are what the log and metrics record.
+
+        Args:
+            url (str): The URL to request.
+            feed (callable): Called with every chunk (bytes); returns True to stop the download.
+            chunk_size (int, optional): The number of bytes read at a time. Defaults to 16384.
+
+        Returns:
+            bool: True if `feed` stopped the download before the end of the body.
+
+        Raises:
+            requests.RequestException: If the request still fails after all retries.
+        """
+        response, entry = self._send(url, stream=True)
+        stopped = False
+        try:
+            for chunk in response.iter_content(chunk_size):
+                if feed(chunk):
+                    stopped = True
+                    break
+        finally:
+            size = self._wire_bytes(response)
+            response.close()
+        with self._lock:
+            entry['bytes'] = size
+        if self.metrics is not None:
+            self.metrics.observe_body(url, size)
+        return stopped
+
+    def _send(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(url, None, 0, time.perf_counter() - start, attempt)
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            entry = self._record(url, response.status_code, self._wire_bytes(response), time.perf_counter() - start,
+                                 attempt)
+            if response.status_code not in RETRY_STATUSES:
+                return response, entry
+            if attempt == self.max_retries:
+                response.raise_for_status()
+            response.close()
+            time.sleep(self.backoff_delay(attempt, response))
+
+    def close(self):
+        """
+        Closes all pooled connections.
+        """
+        self.session.close()
+
+    @staticmethod
+    def _wire_bytes(response):
+        try:
+            return response.raw.tell()
+        except AttributeError:
+            return len(response.content)
+
+    def _record(self, url, status, size, latency, attempt):
+        if self.limiter is not None:
+            self.limiter.feedback(status, latency)
+        if self.metrics is not None:
+            self.metrics.observe_request(url, status, size, latency, attempt)
+            if self.limiter is not None:
+                self.metrics.observe_rate(self.limiter.rate)
+        entry = {'url': url, 'status': status, 'bytes': size, 'latency': latency, 'attempt': attempt}
+        with self._lock:
+            self.log.append(entry)
+        return entry
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host.
+
+    Args:
+        per_host (int): The maximum number of concurrent requests to a single host.
+    """
+
+    def __init__(self, per_host=4):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def slot(self, url):
+        """
+        Returns the semaphore guarding the host of the given URL.
+
+        Args:
+            url (str): The URL about to be requested.
+
+        Returns:
+            threading.BoundedSemaphore: The semaphore for the URL's host.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch_text(url, session=None):
+    """
+    Downloads a page and returns its body as text.
+
+    Args:
+        url (str): The URL to download.
+        session (ScraperSession, optional): The session to send the request through. Defaults to a new session.
+
+    Returns:
+        str: The response body.
+    """
+    if session is None:
+        session = ScraperSession()
+    return session.get(url).text
+
+
+def fetch_all(urls, fetch=None, max_workers=8, per_host=4):
+    """
+    Fetches several URLs concurrently and returns the results in the order of the input.
+
+    Args:
+        urls (list): The URLs to fetch.
+        fetch (callable, optional): Function taking a URL and returning its content. Defaults to fetch_text
+            over a session shared by this call.
+        max_workers (int, optional): The maximum number of concurrent requests overall. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 4.
+
+    Returns:
+        list: The fetched contents, aligned with `urls`.
+    """
+    if fetch is None:
+        session = ScraperSession(pool_size=max_workers)
+        fetch = lambda url: fetch_text(url, session)
+
+    if max_workers <= 1:
+        return [fetch(url) for url in urls]
+
+    limiter = HostLimiter(per_host)
+
+    def polite_fetch(url):
+        with limiter.slot(url):
+            return fetch(url)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(polite_fetch, urls))
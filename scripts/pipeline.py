@@ -0,0 +1,54 @@
+# Fetch/parse pipeline for the scraper
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+from scripts.utils import process_context
+
+
+def ordered_pipeline(items, fetch, parse, fetch_workers=8, parse_workers=None, max_pending=64):
+    """
+    Fetches and parses items concurrently and yields the results in the order of the input.
+
+    Fetching runs on a pool of I/O threads and parsing on a pool of processes, so the network and the CPUs are
+    busy at the same time. At most `max_pending` items are in flight (being fetched, waiting for a parser or
+    parsed but not yet consumed); `items` is only advanced when a slot frees up, so memory stays bounded and a
+    slow consumer throttles the whole pipeline.
+
+    Args:
+        items (iterable): The work items; consumed lazily.
+        fetch (callable): Called in an I/O thread with an item; returns the raw content.
+        parse (callable): Called in a parser process with (raw, item); returns the parsed result. Must be picklable.
+        fetch_workers (int, optional): The number of I/O threads. Defaults to 8.
+        parse_workers (int, optional): The number of parser processes. 0 parses in the I/O threads instead.
+            Defaults to the number of CPUs.
+        max_pending (int, optional): The maximum number of items in flight. Defaults to 64.
+
+    Yields:
+        tuple: (item, raw, result) for every item, in input order.
+    """
+    pool = nullcontext() if parse_workers == 0 else ProcessPoolExecutor(parse_workers, mp_context=process_context())
+    with ThreadPoolExecutor(fetch_workers) as fetchers, pool as parsers:
+        def fetch_and_parse(item):
+            raw = fetch(item)
+            if parsers is None:
+                return raw, parse(raw, item)
+            return raw, parsers.submit(parse, raw, item)
+
+        items = iter(items)
+        window = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(window) < max_pending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                window.append((item, fetchers.submit(fetch_and_parse, item)))
+            if not window:
+                return
+
+            item, future = window.popleft()
+            raw, result = future.result()
+            yield item, raw, result if parsers is None else result.result()
@@ -0,0 +1,123 @@
+# Posting lifecycle tracking for the scraper
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+from scripts.crawl_store import DetailQueue, JobLifecycle, SeenJobs, job_id_from_link
+from scripts.fetcher import HostLimiter, ScraperSession, TokenBucket
+from scripts.scheduler import age_priority
+
+# Statuses meaning a job page is gone for good.
+GONE_STATUSES = {404, 410}
+
+
+def check_job(link, session, etag=None, last_modified=None):
+    """
+    Checks whether a job page still exists with one conditional request.
+
+    The stored validators are sent as If-None-Match and If-Modified-Since, so an unchanged page is answered with a
+    bodiless 304; the body of any other answer is never read. Redirects are not followed: a job redirected to
+    another job keeps its lifetime, a job redirected anywhere else (e.g. to the search page) has closed.
+
+    Args:
+        link (str): The job detail URL.
+        session (ScraperSession): The HTTP session.
+        etag (str, optional): The ETag of the previous check. Defaults to None.
+        last_modified (str, optional): The Last-Modified of the previous check. Defaults to None.
+
+    Returns:
+        tuple: (state, etag, last_modified, changed) where `state` is 'open', 'closed' or 'failed' and `changed`
+            tells whether the page changed since validators were last stored.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        response = session.get(link, headers=headers, stream=True, allow_redirects=False)
+    except requests.RequestException:
+        return 'failed', None, None, False
+    response.close()
+
+    status = response.status_code
+    if status == 304:
+        return 'open', None, None, False
+    if status in GONE_STATUSES:
+        return 'closed', None, None, False
+    if 300 <= status < 400:
+        target = urljoin(link, response.headers.get('Location', ''))
+        return ('open' if job_id_from_link(target) == job_id_from_link(link) else 'closed'), None, None, False
+    if status != 200:
+        return 'failed', None, None, False
+
+    new_etag, new_last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    changed = (etag is not None and new_etag is not None and new_etag != etag) or \
+        (last_modified is not None and new_last_modified is not None and new_last_modified != last_modified)
+    return 'open', new_etag, new_last_modified, changed
+
+
+def revisit_jobs(country, limit=None, max_workers=2, per_host=2, session=None, seen=None, lifecycle=None,
+                 queue=None, budget=None):
+    """
+    Re-checks known jobs of a country to learn which are still open and when the others closed.
+
+    Scraped jobs are first brought into the lifecycle table (`first_seen` and `last_seen` come from their scrape
+    times). Then the open jobs checked longest ago are revisited with `check_job`, one conditional request each,
+    in a batch sized to the request budget, so a budget of N requests checks N jobs; run it periodically and every
+    job comes up in turn. Jobs whose page changed are queued for `backfill_details` to fetch again.
+
+    Args:
+        country (str): The country slug.
+        limit (int, optional): The maximum number of jobs to check. Defaults to the request budget, or all jobs.
+        max_workers (int, optional): The maximum number of concurrent checks. Defaults to 2.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 2.
+        session (ScraperSession, optional): The HTTP session. Defaults to a session limited to 1 request per second,
+            adapting up to 5.
+        seen (SeenJobs, optional): The seen-job index. Defaults to the index in `data/crawl_state.db`.
+        lifecycle (JobLifecycle, optional): The lifecycle table. Defaults to the table in `data/crawl_state.db`.
+        queue (DetailQueue, optional): The back-fill queue. Defaults to the queue in `data/crawl_state.db`.
+        budget (CrawlBudget, optional): The wall-clock and request budget of the run. Defaults to None (no limit).
+
+    Returns:
+        dict: The number of jobs found open, closed, changed and whose check failed.
+    """
+    if session is None:
+        session = ScraperSession(pool_size=max_workers, limiter=TokenBucket(rate=1.0, burst=1.0, max_rate=5.0))
+    if seen is None:
+        seen = SeenJobs()
+    if lifecycle is None:
+        lifecycle = JobLifecycle()
+    if queue is None:
+        queue = DetailQueue()
+
+    lifecycle.track(country, seen.jobs(country))
+    if budget is not None and budget.requests is not None:
+        remaining = max(0, budget.requests - budget.requests_used)
+        limit = remaining if limit is None else min(limit, remaining)
+    due = lifecycle.due(country, limit)
+
+    limiter = HostLimiter(per_host)
+
+    def check(row):
+        job_id, link, etag, last_modified = row
+        with limiter.slot(link):
+            if budget is not None and budget.exhausted():
+                return None
+            return check_job(link, session, etag, last_modified)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        results = list(executor.map(check, due))
+
+    checks = [(row[0], *result[:3]) for row, result in zip(due, results) if result is not None]
+    lifecycle.record(checks)
+    changed = [row[1] for row, result in zip(due, results) if result is not None and result[3]]
+    queue.enqueue(country, changed, age_priority(0, known=True))
+
+    counts = {'open': 0, 'closed': 0, 'failed': 0, 'changed': len(changed)}
+    for _, state, _, _ in checks:
+        counts[state] += 1
+    print(f"[{country}] Revisited {len(checks)} jobs: {counts['open']} open ({counts['changed']} changed), "
+          f"{counts['closed']} closed, {counts['failed']} failed")
+    return counts
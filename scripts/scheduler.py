@@ -0,0 +1,119 @@
+# Detail fetch scheduling for the scraper
+import re
+import time
+
+# Posting ages in days read from a card's relative date, as `clean_data.analyses_date` reads the detail page's.
+# Dates that cannot be read count as this old.
+UNKNOWN_AGE = 60
+
+# Added to the priority of jobs missing from the seen-job index, so every new job is fetched before any refresh.
+MISSING_BONUS = 1000
+
+
+def posting_age_days(date_text):
+    """
+    Reads the age in days of a posting from its relative date on bayt.com (e.g. 'قبل 5 أيام', 'في الامس', '30+').
+
+    Args:
+        date_text (str): The date text of a job card or detail page.
+
+    Returns:
+        int or None: The age in days, or None if the text cannot be read.
+    """
+    if not isinstance(date_text, str):
+        return None
+    if 'اليوم' in date_text or 'ساع' in date_text or 'دقيق' in date_text:
+        return 0
+    if 'الامس' in date_text or 'الأمس' in date_text:
+        return 1
+    if 'يومين' in date_text:
+        return 2
+    match = re.search(r'[0-9]+', date_text)
+    return int(match.group()) if match else None
+
+
+def detail_priority(date_text, known=False):
+    """
+    Ranks a job detail page for fetching: jobs missing from the store first, then the newest postings first.
+
+    Args:
+        date_text (str): The relative posting date shown on the job card.
+        known (bool, optional): Whether the job is already in the seen-job index. Defaults to False.
+
+    Returns:
+        float: The priority; higher is fetched first.
+    """
+    return age_priority(posting_age_days(date_text), known)
+
+
+def age_priority(age, known=False):
+    """
+    Ranks a job detail page by the age of its posting or last change: jobs missing from the store first, then the
+    youngest first.
+
+    Args:
+        age (float or None): The age in days, or None if unknown.
+        known (bool, optional): Whether the job is already in the seen-job index. Defaults to False.
+
+    Returns:
+        float: The priority; higher is fetched first.
+    """
+    return (0 if known else MISSING_BONUS) - (UNKNOWN_AGE if age is None else age)
+
+
+class CrawlBudget:
+    """
+    A wall-clock and request budget for a crawl run.
+
+    The budget only stops new work from being started: a request already sent when it runs out still completes,
+    so a run overshoots by at most the number of concurrent requests. A request budget counts every request of
+    the session, retries and other crawls sharing it included.
+
+    Args:
+        seconds (float, optional): The wall-clock budget, counted from creation. Defaults to None (no limit).
+        requests (int, optional): The request budget, counted on `session`. Defaults to None (no limit).
+        session (ScraperSession, optional): The session whose requests (retries included) are counted.
+            Required with `requests`.
+    """
+
+    def __init__(self, seconds=None, requests=None, session=None):
+        if requests is not None and session is None:
+            raise ValueError('A request budget needs the session to count requests on')
+        self.seconds = seconds
+        self.requests = requests
+        self.session = session
+        self.started = time.monotonic()
+        self._log_start = len(session.log) if session is not None else 0
+
+    @property
+    def requests_used(self):
+        """
+        int: The requests sent through the session since the budget was created.
+        """
+        return len(self.session.log) - self._log_start if self.session is not None else 0
+
+    def exhausted(self):
+        """
+        Tells whether the budget is spent.
+
+        Returns:
+            bool: True once the time or the requests are used up.
+        """
+        if self.seconds is not None and time.monotonic() - self.started >= self.seconds:
+            return True
+        return self.requests is not None and self.requests_used >= self.requests
+
+    def take(self, items):
+        """
+        Yields items until the budget is spent; the rest are not consumed.
+
+        Args:
+            items (iterable): The work items.
+
+        Yields:
+            The items, while budget remains.
+        """
+        for item in items:
+            if self.exhausted():
+                return
+            yield item
@@ -1,122 +1,664 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import os
+import sys
 import time
-import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+if __name__ == '__main__' and not __package__:
+    # Run as `python scripts/scrape_jobs.py`: make the repository root importable for the `scripts.` imports.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from scripts.archive import PageArchive, reparse
+from scripts.crawl_metrics import CrawlMetrics
+from scripts.crawl_store import Checkpoints, DetailQueue, SeenJobs, job_id_from_link
+from scripts.extractor import CARD_COLUMNS, CARD_FIELDS, DETAIL_FIELDS, JOB_FIELDS, PARSERS, DetailStream, extract_cards, extract_job, extract_links
+from scripts.fetcher import HostLimiter, ScraperSession, TokenBucket, fetch_all, fetch_text
+from scripts.pipeline import ordered_pipeline
+from scripts.revisit import revisit_jobs
+from scripts.scheduler import CrawlBudget, age_priority, detail_priority
+from scripts.sinks import CsvSink, JobBuffer
+from scripts.sitemap import discover_changes
+from scripts.utils import DATA_DIR, data_path
+
+BASE_URL = 'https://www.bayt.com'
+
+# The markets the scraper knows: bayt.com slug, number of listing pages and output files. Page counts are upper
+# bounds, a crawl stops at the first listing page without jobs.
 countries = {
-    'egypt': 205,
-    'saudi-arabia': 276,
+    'egypt': {'slug': 'egypt', 'total_pages': 205, 'raw_csv': 'egypt_raw.csv', 'cards_csv': 'egypt_cards.csv'},
+    'saudi-arabia': {'slug': 'saudi-arabia', 'total_pages': 276, 'raw_csv': 'saudi-arabia_raw.csv',
+                     'cards_csv': 'saudi-arabia_cards.csv'},
+    'uae': {'slug': 'uae', 'total_pages': 300, 'raw_csv': 'uae_raw.csv', 'cards_csv': 'uae_cards.csv'},
+    'qatar': {'slug': 'qatar', 'total_pages': 80, 'raw_csv': 'qatar_raw.csv', 'cards_csv': 'qatar_cards.csv'},
+    'kuwait': {'slug': 'kuwait', 'total_pages': 60, 'raw_csv': 'kuwait_raw.csv', 'cards_csv': 'kuwait_cards.csv'},
 }
 
 
+# Options of a plain crawl that a scheduled crawl (cards, then a budgeted back-fill) has no equivalent for.
+_UNSCHEDULED_OPTIONS = ('fast', 'incremental', 'resume', 'archive')
+
+# Names of the fields each extractor is expected to fill, checked for misses by CrawlMetrics.
+_DETAIL_NAMES = [spec[0] for spec in DETAIL_FIELDS]
+_CARD_NAMES = [spec[0] for spec in CARD_FIELDS]
+
+
+def _timed_extract(html, link, parser):
+    if html is None:
+        return None, 0.0
+    start = time.perf_counter()
+    job = extract_job(html, link, parser)
+    return job, time.perf_counter() - start
+
+
+def _parse_detail(html, item, parser):
+    page, link = item
+    return _timed_extract(html, link, parser)
+
+
+def _parse_detail_link(html, link, parser):
+    return _timed_extract(html, link, parser)
+
+
+def _stream_detail(link, session):
+    stream = DetailStream(link)
+    session.stream(link, stream.feed)
+    return stream.job(), stream.seconds
+
+
+def _fetch_detail(link, session, stream, metrics):
+    # One dead detail page must not end a crawl: it is counted as failed and None is returned in its place.
+    try:
+        return _stream_detail(link, session) if stream else fetch_text(link, session)
+    except requests.RequestException as error:
+        print(f"Failed to fetch {link}: {error}")
+        if metrics is not None:
+            metrics.observe_failed_page(link)
+        return None
+
+
+def _streamed(result, item):
+    # The parse step of streamed mode: the job was already extracted while its page downloaded.
+    return (None, 0.0) if result is None else result
+
+
+def _check_stream(parser, archive=None):
+    if parser != 'lxml':
+        raise ValueError(f"Streamed detail pages are parsed with lxml only, got parser {parser!r}")
+    if archive is not None:
+        raise ValueError('Streamed detail pages are not downloaded whole and cannot be archived')
+
+
+def iter_job_pages(country, total_pages, base_url=BASE_URL, max_workers=8, per_host=4, session=None,
+                   incremental=False, seen=None, start_page=1, pending=None, on_links=None, parser='lxml',
+                   archive=None, parse_workers=None, max_pending=64, metrics=None, stream=False):
+    """
+    Crawls the listing pages of a country and yields the scraped jobs one listing page at a time.
+
+    Detail pages flow through `ordered_pipeline`: I/O threads download them while a process pool parses them,
+    and listing pages are read ahead as long as fewer than `max_pending` detail pages are in flight. In streamed
+    mode the I/O threads parse detail pages as they download and close the connection once the fields are read.
+
+    Args:
+        country (str): The country slug used in the bayt.com URL (e.g. 'egypt').
+        total_pages (int): The number of listing pages to crawl.
+        base_url (str, optional): The site root, overridable to crawl a local stand-in server. Defaults to BASE_URL.
+        max_workers (int, optional): The maximum number of detail pages fetched concurrently. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 4.
+        session (ScraperSession, optional): The HTTP session shared by all requests. Defaults to a new pooled
+            session sized to `max_workers` and throttled by an adaptive TokenBucket.
+        incremental (bool, optional): If True, skips jobs already recorded in `seen` and stops at the first listing
+            page holding only known jobs. Defaults to False.
+        seen (SeenJobs, optional): The seen-job index consulted in incremental mode. Defaults to None.
+        start_page (int, optional): The first listing page to crawl. Defaults to 1.
+        pending (list, optional): (page, links) pairs of detail links left unscraped by an interrupted crawl; they
+            are scraped first. Defaults to None.
+        on_links (callable, optional): Called with (page, links) once a page's detail links are known and before
+            they are fetched. Defaults to None.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        archive (PageArchive, optional): If given, every fetched listing and detail page is stored in it.
+            Defaults to None.
+        parse_workers (int, optional): The number of parser processes; 0 parses in the I/O threads.
+            Defaults to the number of CPUs.
+        max_pending (int, optional): The maximum number of detail pages fetched or parsed ahead of the consumer.
+            Defaults to 64.
+        metrics (CrawlMetrics, optional): If given, the parse time of every page is recorded in it.
+            Defaults to None.
+        stream (bool, optional): If True, detail pages are downloaded with `ScraperSession.stream` into a
+            `DetailStream`, stopping once their fields are read. Needs the 'lxml' parser and no archive.
+            Defaults to False.
+
+    Yields:
+        tuple: (page, links, jobs) where `jobs` holds the extracted fields of each link on the page, or None for a
+            detail page that still failed after all retries.
+    """
+    if stream:
+        _check_stream(parser, archive)
+    if session is None:
+        session = ScraperSession(pool_size=max_workers, limiter=TokenBucket(), metrics=metrics)
+    limiter = HostLimiter(per_host)
+    pages = deque()
+
+    def detail_items():
+        for page, links in pending or []:
+            print(f"[{country}] Resuming {len(links)} pending jobs of page {page}...")
+            pages.append((page, links, []))
+            yield from ((page, link) for link in links)
+
+        for page in range(start_page, total_pages + 1):
+            url = f"{base_url}/ar/{country}/jobs/?page={page}"
+            print(f"[{country}] Scrapping data from {page} / {total_pages} is processing...")
+
+            html = fetch_text(url, session)
+            if archive is not None:
+                archive.put(url, html, 'listing', country, page)
+            start = time.perf_counter()
+            links = extract_links(html, base_url, parser)
+            if metrics is not None:
+                metrics.observe_parse('listing', time.perf_counter() - start)
+            if not links:
+                print(f"[{country}] Page {page} has no jobs, stopping")
+                return
+
+            if incremental:
+                known = seen.known(job_id_from_link(link) for link in links)
+                new_links = [link for link in links if job_id_from_link(link) not in known]
+                if links and not new_links:
+                    print(f"[{country}] Page {page} holds only known jobs, stopping")
+                    return
+                links = new_links
+
+            if on_links is not None:
+                on_links(page, links)
+            pages.append((page, links, []))
+            yield from ((page, link) for link in links)
+
+    def fetch_detail(item):
+        page, link = item
+        with limiter.slot(link):
+            return _fetch_detail(link, session, stream, metrics)
+
+    parse = _streamed if stream else partial(_parse_detail, parser=parser)
+    for (page, link), html, (job, seconds) in ordered_pipeline(detail_items(), fetch_detail, parse, max_workers,
+                                                               0 if stream else parse_workers, max_pending):
+        if metrics is not None:
+            metrics.observe_parse('detail', seconds)
+        while len(pages[0][2]) == len(pages[0][1]):
+            yield pages.popleft()
+        if archive is not None and html is not None:
+            archive.put(link, html, 'detail', country, page)
+        pages[0][2].append(job)
+    yield from pages
+
+
 # Web scraping logic here
-def scrapping(country, total_pages):
-    all_jobs = []
-    for page in range(1, total_pages + 1):
-        url = f"https://www.bayt.com/ar/{country}/jobs/?page={page}"
-        print(f"Scrapping data from {page} / {total_pages} is processing...")
-
-        response = requests.get(url)
-        html = response.text
-        soup = BeautifulSoup(html, 'html5lib')
-        job_cards = soup.find_all('li', class_='has-pointer-d')
-
-        for job in job_cards:
-            link_tag = job.find('a', {'data-js-aid': 'jobID'})
-            if not link_tag or not link_tag.get('href'):
-                print("Link not found")
-                continue
-            link = 'https://www.bayt.com' + link_tag.get('href')
-            content = requests.get(link).text
-            job_soup = BeautifulSoup(content, 'html5lib')
+def scrapping(country, total_pages, base_url=BASE_URL, max_workers=8, per_host=4, session=None, incremental=False,
+              seen=None, resume=False, checkpoints=None, parser='lxml', archive=None, parse_workers=None,
+              max_pending=64, fast=False, queue=None, output=None, metrics=None, stream=False):
+    """
+    Scrapes the job listings of a country from bayt.com into `data/<country>_raw.csv`.
+
+    Each listing page's jobs are appended to the CSV, in listing order, as soon as they are scraped, so memory stays
+    flat and a crawl never rewrites the rows it has already saved. A detail page that still fails after all retries
+    does not stop the crawl: it is left out of the CSV and queued for `backfill_details`.
+
+    Args:
+        country (str): The country slug used in the bayt.com URL (e.g. 'egypt').
+        total_pages (int): The number of listing pages to crawl.
+        base_url (str, optional): The site root, overridable to crawl a local stand-in server. Defaults to BASE_URL.
+        max_workers (int, optional): The maximum number of detail pages fetched concurrently. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 4.
+        session (ScraperSession, optional): The HTTP session shared by all requests. Defaults to a new pooled
+            session sized to `max_workers` and throttled by an adaptive TokenBucket.
+        incremental (bool, optional): If True, skips jobs already recorded in the seen-job index, stops paging at the
+            first listing page holding only known jobs and appends the new jobs to the existing raw CSV.
+            Defaults to False.
+        seen (SeenJobs, optional): The seen-job index. Defaults to the index in `data/crawl_state.db`.
+        resume (bool, optional): If True, continues an interrupted crawl from its checkpoint: the raw CSV is cut
+            back to the last checkpointed size, the pending detail links are scraped and paging continues after the
+            last discovered page. Without a checkpoint the crawl starts normally. Defaults to False.
+        checkpoints (Checkpoints, optional): The checkpoint store. Defaults to the store in `data/crawl_state.db`.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        archive (PageArchive, optional): If given, every fetched page is stored in it so the CSV can later be rebuilt
+            with `archive.reparse`. Defaults to None.
+        parse_workers (int, optional): The number of parser processes; 0 parses in the I/O threads.
+            Defaults to the number of CPUs.
+        max_pending (int, optional): The maximum number of detail pages fetched or parsed ahead of the writer.
+            Defaults to 64.
+        fast (bool, optional): If True, runs `scrape_cards` instead: only listing pages are fetched and the detail
+            pages are queued for `backfill_details`. Defaults to False.
+        queue (DetailQueue, optional): The back-fill queue used in fast mode, and for detail pages that still fail
+            after all retries in a full crawl. Defaults to the queue in `data/crawl_state.db`.
+        output (str, optional): The CSV file to write. Defaults to `data/<country>_raw.csv`, or
+            `data/<country>_cards.csv` in fast mode.
+        metrics (CrawlMetrics, optional): If given, parse times and the fields missing from every scraped job are
+            recorded in it. Request metrics come from the session. Defaults to None.
+        stream (bool, optional): If True, detail pages are only downloaded up to their last field (see
+            `iter_job_pages`). Defaults to False.
+
+    Returns:
+        int: The number of jobs scraped in this run.
+    """
+    if seen is None:
+        seen = SeenJobs()
+    if fast:
+        return scrape_cards(country, total_pages, base_url, max_workers, per_host, session, seen, queue, output,
+                            metrics)
+    if output is None:
+        output = data_path(f'{country}_raw.csv')
+    if checkpoints is None:
+        checkpoints = Checkpoints()
+
+    checkpoint = checkpoints.load(country) if resume else None
+    resuming = checkpoint is not None
+    if not resuming:
+        checkpoint = {'last_page': 0, 'pending': [], 'output_size': None}
+
+    last_page = page = checkpoint['last_page']
+    pending = checkpoint['pending']
+    discovered = dict((page, links) for page, links in pending)
+    start_page = max([last_page] + list(discovered)) + 1
+    with CsvSink(output, JOB_FIELDS, append=incremental or resuming,
+                 truncate_to=checkpoint['output_size']) as sink:
+        def save_checkpoint():
+            checkpoints.save(country, last_page, list(discovered.items()), sink.size)
+
+        def on_links(page, links):
+            discovered[page] = links
+            save_checkpoint()
+
+        for page, links, jobs in iter_job_pages(country, total_pages, base_url, max_workers, per_host, session,
+                                                incremental, seen, start_page, pending, on_links, parser, archive,
+                                                parse_workers, max_pending, metrics, stream):
+            failed = [link for link, job in zip(links, jobs) if job is None]
+            if failed:
+                if queue is None:
+                    queue = DetailQueue()
+                queue.enqueue(country, failed, age_priority(None))
+            jobs = [job for job in jobs if job is not None]
+            sink.write(jobs)
+            if metrics is not None:
+                metrics.observe_jobs('detail', jobs, _DETAIL_NAMES)
+            seen.add(country, [(job_id_from_link(job['link']), job['link']) for job in jobs])
+            del discovered[page]
+            last_page = page
+            save_checkpoint()
+    checkpoints.clear(country)
+    print(f"[{country}] Scraping {sink.rows} jobs in {page} pages, success")
+    return sink.rows
+
+
+def crawl_frame(country, total_pages, base_url=BASE_URL, max_workers=8, per_host=4, session=None, parser='lxml',
+                parse_workers=None, max_pending=64, metrics=None, stream=False, categorical=False):
+    """
+    Scrapes the job listings of a country into a DataFrame instead of a CSV, e.g. for a notebook.
+
+    Jobs are collected in a columnar JobBuffer rather than a list of dicts, so repeated values such as companies,
+    locations and industries are held once and the crawl's peak memory stays a fraction of the dict-based one.
+    No crawl state is read or written.
+
+    Args:
+        country (str): The country slug used in the bayt.com URL (e.g. 'egypt').
+        total_pages (int): The number of listing pages to crawl.
+        base_url (str, optional): The site root, overridable to crawl a local stand-in server. Defaults to BASE_URL.
+        max_workers (int, optional): The maximum number of detail pages fetched concurrently. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 4.
+        session (ScraperSession, optional): The HTTP session shared by all requests. Defaults to a new pooled
+            session sized to `max_workers` and throttled by an adaptive TokenBucket.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        parse_workers (int, optional): The number of parser processes; 0 parses in the I/O threads.
+            Defaults to the number of CPUs.
+        max_pending (int, optional): The maximum number of detail pages fetched or parsed ahead. Defaults to 64.
+        metrics (CrawlMetrics, optional): If given, parse times and the fields missing from every scraped job are
+            recorded in it. Defaults to None.
+        stream (bool, optional): If True, detail pages are only downloaded up to their last field (see
+            `iter_job_pages`). Defaults to False.
+        categorical (bool, optional): If True, the repeated columns are returned as categoricals (see
+            `JobBuffer.to_frame`). Defaults to False.
 
-            title_elem = job_soup.find('h1', {'id': 'job_title'})
-            title = title_elem.text.strip() if title_elem else None
+    Returns:
+        pd.DataFrame: The scraped jobs, with the columns of the raw CSV.
+    """
+    buffer = JobBuffer(JOB_FIELDS)
+    for page, links, jobs in iter_job_pages(country, total_pages, base_url, max_workers, per_host, session,
+                                            parser=parser, parse_workers=parse_workers, max_pending=max_pending,
+                                            metrics=metrics, stream=stream):
+        jobs = [job for job in jobs if job is not None]
+        buffer.write(jobs)
+        if metrics is not None:
+            metrics.observe_jobs('detail', jobs, _DETAIL_NAMES)
+    print(f"[{country}] Scraping {buffer.rows} jobs, success")
+    return buffer.to_frame(categorical)
 
-            company_elem = job_soup.find('a', {'class': 't-default t-bold'})
-            company_name = company_elem.text.strip() if company_elem else None
 
-            date_elem = job_soup.find('span', {'id': 'jb-posted-date'})
-            date = date_elem.text.strip() if date_elem else None
+def scrape_cards(country, total_pages, base_url=BASE_URL, max_workers=8, per_host=4, session=None, seen=None,
+                 queue=None, output=None, metrics=None, refresh=False):
+    """
+    Fast crawl: scrapes only the job cards of the listing pages into `data/<country>_cards.csv`.
 
-            salary_elem = job_soup.find('div', {'data-automation-id': 'id_salary_range'})
-            salary = salary_elem.text.strip() if salary_elem else None
+    The cards carry the fields in CARD_FIELDS (title, company, location and posted date); every other field is
+    left empty and marked with `detail_fetched` False. The detail pages of jobs not in the seen-job index are
+    queued so `backfill_details` can fetch them later, newest postings first (see `scheduler.detail_priority`).
+    Listing pages are fetched `max_workers` at a time.
+
+    Args:
+        country (str): The country slug used in the bayt.com URL (e.g. 'egypt').
+        total_pages (int): The number of listing pages to crawl.
+        base_url (str, optional): The site root, overridable to crawl a local stand-in server. Defaults to BASE_URL.
+        max_workers (int, optional): The maximum number of listing pages fetched concurrently. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 4.
+        session (ScraperSession, optional): The HTTP session shared by all requests. Defaults to a new pooled
+            session sized to `max_workers` and throttled by an adaptive TokenBucket.
+        seen (SeenJobs, optional): The seen-job index. Defaults to the index in `data/crawl_state.db`.
+        queue (DetailQueue, optional): The back-fill queue. Defaults to the queue in `data/crawl_state.db`.
+        output (str, optional): The CSV file to write. Defaults to `data/<country>_cards.csv`.
+        metrics (CrawlMetrics, optional): If given, parse times and the card fields missing from every scraped job
+            are recorded in it. Defaults to None.
+        refresh (bool, optional): If True, jobs already in the seen-job index are queued too, behind every new
+            job, so their details are fetched again. Defaults to False.
+
+    Returns:
+        int: The number of cards scraped.
+    """
+    if session is None:
+        session = ScraperSession(pool_size=max_workers, limiter=TokenBucket(), metrics=metrics)
+    if seen is None:
+        seen = SeenJobs()
+    if queue is None:
+        queue = DetailQueue()
+    if output is None:
+        output = data_path(f'{country}_cards.csv')
+
+    pages = list(range(1, total_pages + 1))
+    with CsvSink(output, CARD_COLUMNS) as sink:
+        for start in range(0, len(pages), max_workers):
+            batch = pages[start:start + max_workers]
+            print(f"[{country}] Scrapping cards from {batch[-1]} / {total_pages} is processing...")
+            urls = [f"{base_url}/ar/{country}/jobs/?page={page}" for page in batch]
+            for html in fetch_all(urls, fetch=lambda url: fetch_text(url, session), max_workers=max_workers,
+                                  per_host=per_host):
+                parse_start = time.perf_counter()
+                jobs = extract_cards(html, base_url)
+                if metrics is not None:
+                    metrics.observe_parse('listing', time.perf_counter() - parse_start)
+                if not jobs:
+                    break
+                sink.write(jobs)
+                if metrics is not None:
+                    metrics.observe_jobs('card', jobs, _CARD_NAMES)
+                known = seen.known(job_id_from_link(job['link']) for job in jobs)
+                queued = [job for job in jobs if refresh or job_id_from_link(job['link']) not in known]
+                queue.enqueue(country, [job['link'] for job in queued],
+                              [detail_priority(job['date'], job_id_from_link(job['link']) in known) for job in queued])
+            if not jobs:
+                print(f"[{country}] A listing page has no jobs, stopping")
+                break
+    print(f"[{country}] Scraping {sink.rows} job cards, success; "
+          f"{queue.count(country)} detail pages queued")
+    return sink.rows
+
+
+def backfill_details(country, limit=None, max_workers=2, per_host=2, session=None, seen=None, queue=None,
+                     parser='lxml', parse_workers=0, batch_size=50, output=None, metrics=None, budget=None,
+                     stream=False):
+    """
+    Fetches queued detail pages and appends their jobs to `data/<country>_raw.csv`.
+
+    Pages are fetched highest priority first: jobs missing from the store, then the newest postings. Back-filling
+    runs at a lower priority than a crawl: by default it uses few workers and a gentle rate limit. Under a budget,
+    no page is started once the budget is spent and the pages not reached stay queued for the next run. Links
+    leave the queue only once their rows are written.
+
+    A job fetched again (e.g. its page changed) is appended as a new row; `dedup.drop_near_duplicates` keeps the
+    newest row of every link.
+
+    Args:
+        country (str): The country slug.
+        limit (int, optional): The maximum number of detail pages to fetch. Defaults to the whole queue.
+        max_workers (int, optional): The maximum number of detail pages fetched concurrently. Defaults to 2.
+        per_host (int, optional): The maximum number of concurrent requests to the same host. Defaults to 2.
+        session (ScraperSession, optional): The HTTP session. Defaults to a session limited to 1 request per second,
+            adapting up to 5.
+        seen (SeenJobs, optional): The seen-job index. Defaults to the index in `data/crawl_state.db`.
+        queue (DetailQueue, optional): The back-fill queue. Defaults to the queue in `data/crawl_state.db`.
+        parser (str, optional): The HTML parser backend, 'lxml' or 'html5lib'. Defaults to 'lxml'.
+        parse_workers (int, optional): The number of parser processes; 0 parses in the I/O threads. Defaults to 0.
+        batch_size (int, optional): The number of jobs written at a time. Defaults to 50.
+        output (str, optional): The CSV file to append to. Defaults to `data/<country>_raw.csv`.
+        metrics (CrawlMetrics, optional): If given, parse times and the fields missing from every back-filled job are
+            recorded in it. Defaults to None.
+        budget (CrawlBudget, optional): The wall-clock and request budget of the run. Defaults to None (no limit).
+        stream (bool, optional): If True, detail pages are only downloaded up to their last field (see
+            `iter_job_pages`). Defaults to False.
+
+    Returns:
+        int: The number of jobs back-filled.
+    """
+    if stream:
+        _check_stream(parser)
+    if session is None:
+        session = ScraperSession(pool_size=max_workers, limiter=TokenBucket(rate=1.0, burst=1.0, max_rate=5.0),
+                                 metrics=metrics)
+    if seen is None:
+        seen = SeenJobs()
+    if queue is None:
+        queue = DetailQueue()
+    if output is None:
+        output = data_path(f'{country}_raw.csv')
+
+    limiter = HostLimiter(per_host)
+
+    def fetch_detail(link):
+        with limiter.slot(link):
+            if budget is not None and budget.exhausted():
+                return None
+            return _fetch_detail(link, session, stream, metrics)
+
+    def flush(links, jobs):
+        sink.write(jobs)
+        if metrics is not None:
+            metrics.observe_jobs('detail', jobs, _DETAIL_NAMES)
+        seen.add(country, [(job_id_from_link(link), link) for link in links])
+        queue.remove(links)
+
+    queued = queue.peek(country, limit)
+    if budget is not None:
+        queued = budget.take(queued)
+
+    links, jobs = [], []
+    with CsvSink(output, JOB_FIELDS, append=True) as sink:
+        parse = _streamed if stream else partial(_parse_detail_link, parser=parser)
+        for link, html, (job, seconds) in ordered_pipeline(queued, fetch_detail, parse, max_workers,
+                                                           0 if stream else parse_workers,
+                                                           max_pending=2 * max_workers):
+            if html is None:
+                continue
+            if metrics is not None:
+                metrics.observe_parse('detail', seconds)
+            links.append(link)
+            jobs.append(job)
+            if len(jobs) == batch_size:
+                flush(links, jobs)
+                links, jobs = [], []
+        flush(links, jobs)
+    spent = ' (budget spent)' if budget is not None and budget.exhausted() else ''
+    print(f"[{country}] Back-filled {sink.rows} jobs{spent}, {queue.count(country)} still queued")
+    return sink.rows
 
-            career_level_elem = job_soup.find('div', {'data-automation-id': 'id_type_level_experience'})
-            career_level = career_level_elem.text.strip() if career_level_elem else None
 
-            location_elem = job_soup.find('span', {'class': 't-mute'})
-            location = location_elem.text.strip() if location_elem else None
+def crawl_markets(markets, base_url=BASE_URL, rate=5.0, max_rate=50.0, max_workers=8, per_host=4, parse_workers=None,
+                  metrics_path=data_path('crawl_metrics'), time_budget=None, max_requests=None, refresh=False,
+                  **options):
+    """
+    Crawls several markets of the country registry concurrently under one global rate budget.
 
-            num_of_vacancies_elem = job_soup.find('div', {'data-automation-id': 'id_number_of_vacancies'})
-            num_of_vacancies = num_of_vacancies_elem.text.strip() if num_of_vacancies_elem else None
+    Every market runs `scrapping` in its own thread; all of them share one pooled session and one adaptive
+    TokenBucket, so adding markets spreads the same request rate across them instead of multiplying it. Progress
+    lines are prefixed with the market's slug. The run is instrumented with CrawlMetrics; its JSON summary and
+    Prometheus text are written next to each other at `metrics_path`.
 
-            industry_elem = job_soup.find('div', {'data-automation-id': 'id_company_employees_industry'})
-            industry = industry_elem.text.strip() if industry_elem else None
+    With a time or request budget the crawl is scheduled instead: every market first scrapes its listing cards,
+    queueing the detail pages by priority, then back-fills them newest first until the shared budget is spent.
+    Whatever is left stays queued for the next run's `backfill_details`.
 
-            decription_elem = job_soup.find('div', {'class': 'card-content p20t is-spaced'})
-            description_header = decription_elem.find_next('h2')
-            description_text = description_header.find_next('div')
-            description = description_text.text.strip() if description_text else None
+    Args:
+        markets (list): Keys of `countries`.
+        base_url (str, optional): The site root, overridable to crawl a local stand-in server. Defaults to BASE_URL.
+        rate (float, optional): The initial global rate in requests per second. Defaults to 5.
+        max_rate (float, optional): The highest global rate the limiter ramps up to. Defaults to 50.
+        max_workers (int, optional): The maximum number of concurrent requests per market. Defaults to 8.
+        per_host (int, optional): The maximum number of concurrent requests to the same host per market.
+            Defaults to 4.
+        parse_workers (int, optional): The number of parser processes per market. Defaults to the CPUs split
+            evenly across the markets.
+        metrics_path (str, optional): The metrics output path without extension, or None to skip writing them.
+            Defaults to `data/crawl_metrics`.
+        time_budget (float, optional): The wall-clock budget in seconds of a scheduled crawl. Defaults to None.
+        max_requests (int, optional): The request budget of a scheduled crawl, shared by all markets.
+            Defaults to None.
+        refresh (bool, optional): In a scheduled crawl, also queues jobs scraped before, behind the new ones.
+            Defaults to False.
+        **options: Further keyword arguments passed to `scrapping` (e.g. fast, incremental, resume, archive,
+            stream). A scheduled crawl only takes parser and stream.
 
-            skills_elem = job_soup.find('div', {'class': 'card-content is-spaced t-break print-break-before p20t'})
-            skills = skills_elem.text.strip() if skills_elem else None
+    Returns:
+        dict: The number of jobs scraped per market (with details, in a scheduled crawl).
 
-            remote_elem = job_soup.find('div', {'data-automation-id': 'id_remote_working'})
-            remote = remote_elem.text.strip() if remote_elem else None
+    Raises:
+        ValueError: If a scheduled crawl is given fast, incremental, resume or archive.
+    """
+    scheduled = time_budget is not None or max_requests is not None
+    unsupported = [option for option in _UNSCHEDULED_OPTIONS if options.get(option)]
+    if scheduled and unsupported:
+        raise ValueError(f"A scheduled crawl (time or request budget) does not support {', '.join(unsupported)}")
 
-            num_of_exp_elem = job_soup.find('div', {'data-automation-id': 'data_عدد_سنوات_الخبرة'})
-            num_of_exp = num_of_exp_elem.text.strip() if num_of_exp_elem else None
+    metrics = CrawlMetrics()
+    session = ScraperSession(pool_size=max_workers * len(markets),
+                             limiter=TokenBucket(rate=rate, burst=rate, max_rate=max_rate), metrics=metrics)
+    if parse_workers is None:
+        parse_workers = max(1, (os.cpu_count() or 1) // len(markets))
 
-            residence_area_elem = job_soup.find('div', {'data-automation-id': 'data_منطقة_الإقامة'})
-            residence_area = residence_area_elem.text.strip() if residence_area_elem else None
+    budget = CrawlBudget(time_budget, max_requests, session) if scheduled else None
 
-            nationality_elem = job_soup.find('div', {'data-automation-id': 'data_الجنسية'})
-            nationality = nationality_elem.text.strip() if nationality_elem else None
+    def crawl(market):
+        entry = countries[market]
+        if budget is not None:
+            scrape_cards(entry['slug'], entry['total_pages'], base_url, max_workers, per_host, session,
+                         output=data_path(entry['cards_csv']), metrics=metrics, refresh=refresh)
+            return backfill_details(entry['slug'], max_workers=max_workers, per_host=per_host, session=session,
+                                    parser=options.get('parser', 'lxml'), parse_workers=parse_workers,
+                                    output=data_path(entry['raw_csv']), metrics=metrics, budget=budget,
+                                    stream=options.get('stream', False))
+        output = data_path(entry['cards_csv' if options.get('fast') else 'raw_csv'])
+        return scrapping(entry['slug'], entry['total_pages'], base_url=base_url, max_workers=max_workers,
+                         per_host=per_host, session=session, parse_workers=parse_workers, output=output,
+                         metrics=metrics, **options)
 
-            sex_elem = job_soup.find('div', {'data-automation-id': 'data_الجنس'})
-            sex = sex_elem.text.strip() if sex_elem else None
+    with ThreadPoolExecutor(len(markets)) as executor:
+        futures = {market: executor.submit(crawl, market) for market in markets}
+        results = {market: future.result() for market, future in futures.items()}
+    summary = metrics.summary()
+    print(f"Crawled {sum(results.values())} jobs from {len(markets)} markets in {summary['elapsed_seconds']:.1f}s: "
+          f"{summary['requests_per_second']:.1f} requests/s, {summary['bytes'] / 2 ** 20:.1f} MiB, "
+          f"{summary['retries']} retries, final rate limit {session.limiter.rate:.1f} requests/s")
+    if metrics_path is not None:
+        metrics.write(metrics_path)
+    return results
 
-            qualification_elem = job_soup.find('div', {'data-automation-id': 'data_الشهادة'})
-            qualification = qualification_elem.text.strip() if qualification_elem else None
 
-            age_elem = job_soup.find('div', {'data-automation-id': 'data_العمر'})
-            age = age_elem.text.strip() if age_elem else None
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Scrape bayt.com job postings.')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
 
-            specialization_elem = job_soup.find('div', {'data-automation-id': 'data_التخصص'})
-            specialization = specialization_elem.text.strip() if specialization_elem else None
+    crawl_parser = commands.add_parser('crawl', help='Crawl one or more markets concurrently.')
+    crawl_parser.add_argument('markets', nargs='+', choices=sorted(countries), help='The markets to crawl.')
+    crawl_parser.add_argument('--fast', action='store_true', help='Only scrape listing cards, queue detail pages.')
+    crawl_parser.add_argument('--incremental', action='store_true', help='Skip jobs scraped by earlier runs.')
+    crawl_parser.add_argument('--resume', action='store_true', help='Continue interrupted crawls.')
+    crawl_parser.add_argument('--archive', action='store_true', help='Keep the fetched HTML in data/archive.')
+    crawl_parser.add_argument('--rate', type=float, default=5.0, help='Initial global requests per second.')
+    crawl_parser.add_argument('--max-rate', type=float, default=50.0, help='Highest global requests per second.')
+    crawl_parser.add_argument('--workers', type=int, default=8, help='Concurrent requests per market.')
+    crawl_parser.add_argument('--parser', default='lxml', choices=PARSERS, help='The HTML parser backend.')
+    crawl_parser.add_argument('--stream', action='store_true',
+                              help='Stop downloading detail pages once their fields are read.')
+    crawl_parser.add_argument('--base-url', default=BASE_URL, help='The site root, e.g. a local stand-in server.')
+    crawl_parser.add_argument('--time-budget', type=float, default=None,
+                              help='Schedule the crawl: cards first, then details newest first for this many seconds.')
+    crawl_parser.add_argument('--max-requests', type=int, default=None,
+                              help='Schedule the crawl under this many requests across all markets.')
+    crawl_parser.add_argument('--refresh', action='store_true',
+                              help='In a scheduled crawl, also queue known jobs, after the new ones.')
+    crawl_parser.add_argument('--metrics', default=data_path('crawl_metrics'),
+                              help='Where to write the metrics, without extension (.json and .prom are added).')
 
-            experience_elem = job_soup.find('div', {'data-automation-id': 'data__المستوى_المهني'})
-            experience = experience_elem.text.strip() if experience_elem else None
+    backfill_parser = commands.add_parser('backfill', help='Fetch detail pages queued by fast crawls.')
+    backfill_parser.add_argument('markets', nargs='+', choices=sorted(countries), help='The markets to back-fill.')
+    backfill_parser.add_argument('--limit', type=int, default=None, help='Detail pages to fetch per market.')
+    backfill_parser.add_argument('--time-budget', type=float, default=None,
+                                 help='Stop starting pages after this many seconds; the rest stay queued.')
+    backfill_parser.add_argument('--max-requests', type=int, default=None,
+                                 help='Stop starting pages after this many requests; the rest stay queued.')
+    backfill_parser.add_argument('--stream', action='store_true',
+                                 help='Stop downloading detail pages once their fields are read.')
 
-            all_jobs.append({
-                'link': link,
-                'title': title,
-                'company_name': company_name,
-                'date': date,
-                'salary': salary,
-                'career_level': career_level,
-                'location': location,
-                'num_of_vacancies': num_of_vacancies,
-                'industry': industry,
-                'description': description,
-                'skills': skills,
-                'remote': remote,
-                'num_of_exp': num_of_exp,
-                'residence_area': residence_area,
-                'nationality': nationality,
-                'sex': sex,
-                'qualification': qualification,
-                'age': age,
-                'specialization': specialization,
-                'experience': experience
+    discover_parser = commands.add_parser('discover',
+                                          help='Queue new and changed jobs from the sitemap for back-filling.')
+    discover_parser.add_argument('markets', nargs='+', choices=sorted(countries), help='The markets to discover.')
+    discover_parser.add_argument('--base-url', default=BASE_URL, help='The site root, e.g. a local stand-in server.')
+    discover_parser.add_argument('--sitemap', default=None,
+                                 help='The sitemap index URL. Defaults to <base-url>/sitemap.xml.')
 
-            })
-        pd.DataFrame(all_jobs).to_csv(f'../data/{country}_raw.csv', encoding='uft-8-sig', index=False)
-        time.sleep(1)
-    print(f"Scraping {len(all_jobs)} jobs in {total_pages} pages, success")
-    return pd.DataFrame(all_jobs)
+    revisit_parser = commands.add_parser('revisit', help='Re-check known jobs to track when they close.')
+    revisit_parser.add_argument('markets', nargs='+', choices=sorted(countries), help='The markets to revisit.')
+    revisit_parser.add_argument('--limit', type=int, default=None, help='Jobs to check per market.')
+    revisit_parser.add_argument('--time-budget', type=float, default=None,
+                                help='Stop starting checks after this many seconds.')
+    revisit_parser.add_argument('--max-requests', type=int, default=None,
+                                help='Check at most this many jobs across all markets, one request each.')
 
+    reparse_parser = commands.add_parser('reparse', help='Rebuild raw CSVs from the HTML archive.')
+    reparse_parser.add_argument('markets', nargs='+', choices=sorted(countries), help='The markets to rebuild.')
+    reparse_parser.add_argument('--parser', default='lxml', choices=PARSERS, help='The HTML parser backend.')
 
-scrapping(countries['egypt'], countries['total_pages'])
-scrapping(countries['saudi-arabia'], countries['total_pages'])
+    args = arg_parser.parse_args()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if args.command == 'crawl':
+        if args.time_budget is not None or args.max_requests is not None:
+            unsupported = [f'--{option}' for option in _UNSCHEDULED_OPTIONS if getattr(args, option)]
+            if unsupported:
+                arg_parser.error(f"{', '.join(unsupported)} cannot be combined with --time-budget/--max-requests")
+        crawl_options = {'fast': args.fast, 'incremental': args.incremental, 'resume': args.resume,
+                         'parser': args.parser, 'stream': args.stream}
+        if args.archive:
+            crawl_options['archive'] = PageArchive()
+        crawl_markets(args.markets, base_url=args.base_url, rate=args.rate, max_rate=args.max_rate,
+                      max_workers=args.workers, metrics_path=args.metrics, time_budget=args.time_budget,
+                      max_requests=args.max_requests, refresh=args.refresh, **crawl_options)
+    elif args.command == 'backfill':
+        backfill_session = ScraperSession(pool_size=2, limiter=TokenBucket(rate=1.0, burst=1.0, max_rate=5.0))
+        backfill_budget = CrawlBudget(args.time_budget, args.max_requests, backfill_session)
+        for market in args.markets:
+            backfill_details(countries[market]['slug'], args.limit, session=backfill_session,
+                             output=data_path(countries[market]['raw_csv']), budget=backfill_budget,
+                             stream=args.stream)
+    elif args.command == 'discover':
+        discover_session = ScraperSession(limiter=TokenBucket(rate=1.0, burst=1.0, max_rate=5.0))
+        for market in args.markets:
+            discover_changes(countries[market]['slug'], args.sitemap or f'{args.base_url}/sitemap.xml',
+                             session=discover_session)
+    elif args.command == 'revisit':
+        revisit_session = ScraperSession(pool_size=2, limiter=TokenBucket(rate=1.0, burst=1.0, max_rate=5.0))
+        revisit_budget = CrawlBudget(args.time_budget, args.max_requests, revisit_session)
+        for market in args.markets:
+            revisit_jobs(countries[market]['slug'], args.limit, session=revisit_session, budget=revisit_budget)
+    else:
+        for market in args.markets:
+            try:
+                reparse(countries[market]['slug'], output=data_path(countries[market]['raw_csv']),
+                        parser=args.parser)
+            except ValueError as error:
+                print(f'[{market}] {error}')
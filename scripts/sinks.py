@@ -0,0 +1,168 @@
+# Output sinks for scraped records
+import csv
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Job fields whose values repeat across postings (companies, places, levels, relative dates); JobBuffer stores
+# each distinct value once.
+REPEATED_FIELDS = ['company_name', 'date', 'salary', 'career_level', 'location', 'num_of_vacancies', 'industry',
+                   'remote', 'num_of_exp', 'residence_area', 'nationality', 'sex', 'qualification', 'age',
+                   'specialization', 'experience', 'detail_fetched']
+
+
+class CsvSink:
+    """
+    Appends records to a CSV file chunk by chunk, so a crawl never rewrites or holds the whole file.
+
+    The file is byte-for-byte what `pd.DataFrame(records).to_csv(path, encoding='utf-8-sig', index=False)`
+    would produce for all records at once: the BOM and header are written once and every chunk is appended.
+
+    Args:
+        path (str): The CSV file to write.
+        columns (list): The column order of the file.
+        append (bool, optional): If True and the file exists, appends to it and keeps its header. Defaults to False.
+        truncate_to (int, optional): When appending, first cuts the file back to this many bytes, dropping rows
+            written after a checkpoint. Defaults to None.
+    """
+
+    def __init__(self, path, columns, append=False, truncate_to=None):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+
+        if append and truncate_to is not None and os.path.exists(path):
+            with open(path, 'r+b') as existing:
+                existing.truncate(truncate_to)
+
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, encoding='utf-8-sig', newline='') as existing:
+                self.columns = next(csv.reader(existing))
+            self._file = open(path, 'a', encoding='utf-8', newline='')
+            self._header = False
+        else:
+            self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+            self._header = True
+
+    @property
+    def size(self):
+        """
+        int: The size of the file in bytes, as of the last write.
+        """
+        return os.path.getsize(self.path)
+
+    def write(self, records):
+        """
+        Appends a chunk of records to the file and syncs it to disk.
+
+        Args:
+            records (iterable): Dicts keyed by column name.
+        """
+        chunk = pd.DataFrame(list(records), columns=self.columns)
+        if chunk.empty and not self._header:
+            return
+        chunk.to_csv(self._file, header=self._header, index=False)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._header = False
+        self.rows += len(chunk)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JobBuffer:
+    """
+    Holds scraped records in memory column by column, a compact alternative to a list of per-record dicts.
+
+    Each column is one list of values instead of a dict entry per record. Columns in `repeated` keep every distinct
+    value once, in a pool, and an int32 code per record, so a company or location shared by thousands of postings
+    costs 4 bytes per posting. `to_frame` builds the DataFrame with at most one copy of each column. The buffer has
+    the `write`/`rows` interface of CsvSink and can stand in for it.
+
+    Args:
+        columns (list): The column order of the records.
+        repeated (list, optional): The columns stored as codes into a pool of distinct values.
+            Defaults to REPEATED_FIELDS.
+    """
+
+    def __init__(self, columns, repeated=REPEATED_FIELDS):
+        self.columns = list(columns)
+        self.rows = 0
+        self._values = {column: [] for column in self.columns if column not in repeated}
+        self._codes = {column: array('i') for column in self.columns if column in repeated}
+        self._pools = {column: {} for column in self._codes}
+
+    def write(self, records):
+        """
+        Appends records to the buffer.
+
+        Args:
+            records (iterable): Dicts keyed by column name; missing keys are stored as None.
+        """
+        for record in records:
+            for column, values in self._values.items():
+                values.append(record.get(column))
+            for column, codes in self._codes.items():
+                value = record.get(column)
+                if value is None:
+                    codes.append(-1)
+                    continue
+                pool = self._pools[column]
+                code = pool.get(value)
+                if code is None:
+                    code = pool[value] = len(pool)
+                codes.append(code)
+            self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+    def to_frame(self, categorical=False):
+        """
+        Builds a DataFrame of the buffered records.
+
+        Args:
+            categorical (bool, optional): If True, the repeated columns become pandas categoricals over their pools,
+                which keeps the memory saving in the DataFrame; otherwise they are plain object columns like a
+                DataFrame read from the CSV. Defaults to False.
+
+        Returns:
+            pd.DataFrame: The records, one column per entry of `columns`.
+        """
+        data = {}
+        for column in self.columns:
+            if column in self._values:
+                data[column] = np.array(self._values[column], dtype=object)
+                continue
+            # The codes are read in place; None is appended to the pool so the code -1 of a missing value picks it.
+            codes = np.frombuffer(self._codes[column], dtype=np.int32)
+            pool = np.array(list(self._pools[column]) + [None], dtype=object)
+            if categorical:
+                data[column] = pd.Categorical.from_codes(codes, pool[:-1])
+            else:
+                data[column] = pool[codes]
+            del codes  # releases the view, or the buffer could not grow again
+        return pd.DataFrame(data, columns=self.columns, copy=False)
+
+    def close(self):
+        """
+        Does nothing; the buffer keeps its records until it is dropped.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
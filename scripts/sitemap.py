@@ -0,0 +1,158 @@
+# Sitemap-based change discovery for the scraper
+import gzip
+import io
+import re
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from lxml import etree
+
+from scripts.crawl_store import DetailQueue, SeenJobs, Sitemaps, job_id_from_link
+from scripts.fetcher import ScraperSession
+from scripts.scheduler import age_priority
+
+
+def parse_lastmod(text):
+    """
+    Reads a sitemap `lastmod` (W3C datetime, e.g. '2024-05-01', '2024-05-01T10:30:00+03:00' or '...Z').
+
+    Args:
+        text (str): The `lastmod` text.
+
+    Returns:
+        datetime or None: The time as a naive local datetime, comparable with the scrape times of SeenJobs, or None
+            if the text is missing or cannot be read.
+    """
+    if not text:
+        return None
+    try:
+        moment = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo is not None else moment
+
+
+def parse_sitemap(content):
+    """
+    Parses a sitemap index or a URL set, gzipped or not.
+
+    The XML is read incrementally and every entry is dropped once read, so sitemaps of 50,000 URLs do not build a
+    whole tree in memory.
+
+    Args:
+        content (bytes): The sitemap document.
+
+    Returns:
+        list: (loc, lastmod) pairs, `lastmod` being the raw text or None. For an index the locations are the child
+            sitemaps, for a URL set the pages.
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    entries = []
+    for _, element in etree.iterparse(io.BytesIO(content), events=('end',), resolve_entities=False, no_network=True):
+        name = etree.QName(element).localname
+        if name not in ('url', 'sitemap'):
+            continue
+        fields = {etree.QName(child).localname: (child.text or '').strip() for child in element}
+        if fields.get('loc'):
+            entries.append((fields['loc'], fields.get('lastmod') or None))
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    return entries
+
+
+def _is_index(content):
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    return re.search(rb'<(?:\w+:)?sitemapindex[\s>]', content[:2048]) is not None
+
+
+def job_links(entries, country):
+    """
+    Keeps the job detail pages of a country from sitemap entries.
+
+    Args:
+        entries (list): (loc, lastmod) pairs from `parse_sitemap`.
+        country (str): The country slug (e.g. 'egypt').
+
+    Returns:
+        list: The (loc, lastmod) pairs whose path is a job page of the country
+            (e.g. '/ar/egypt/jobs/accountant-5123456/').
+    """
+    prefix = f'/ar/{country}/jobs/'
+    return [(loc, lastmod) for loc, lastmod in entries
+            if urlsplit(loc).path.startswith(prefix) and job_id_from_link(loc).isdigit()]
+
+
+def discover_changes(country, sitemap_url, session=None, seen=None, queue=None, sitemaps=None, now=None):
+    """
+    Queues the job pages of a country that are new or changed since they were last scraped, read from the site's
+    sitemap instead of its listing pages.
+
+    The sitemap index is fetched first; child sitemaps whose `lastmod` is the one they had at the previous
+    discovery are skipped, so a quiet day costs one request instead of a walk over every listing page. In the child
+    sitemaps read, a job is queued when it is missing from the seen-job index or its `lastmod` is newer than its
+    last scrape; `backfill_details` then fetches and extracts them, missing jobs first, then the most recently
+    changed. A URL set given directly instead of an index is always read.
+
+    Args:
+        country (str): The country slug.
+        sitemap_url (str): The sitemap index (or URL set) of the site.
+        session (ScraperSession, optional): The HTTP session. Defaults to a new session.
+        seen (SeenJobs, optional): The seen-job index. Defaults to the index in `data/crawl_state.db`.
+        queue (DetailQueue, optional): The back-fill queue. Defaults to the queue in `data/crawl_state.db`.
+        sitemaps (Sitemaps, optional): The sitemap state. Defaults to the state in `data/crawl_state.db`.
+        now (datetime, optional): The current time, used to rank changes by age. Defaults to now.
+
+    Returns:
+        dict: The sitemaps read and skipped, and the new and changed jobs queued.
+    """
+    if session is None:
+        session = ScraperSession()
+    if seen is None:
+        seen = SeenJobs()
+    if queue is None:
+        queue = DetailQueue()
+    if sitemaps is None:
+        sitemaps = Sitemaps()
+    if now is None:
+        now = datetime.now()
+
+    stats = {'sitemaps_read': 0, 'sitemaps_skipped': 0, 'new': 0, 'changed': 0}
+    content = session.get(sitemap_url).content
+    if _is_index(content):
+        children = parse_sitemap(content)
+    else:
+        children, stats['sitemaps_read'] = [], 1
+        _queue_changes(country, job_links(parse_sitemap(content), country), seen, queue, now, stats)
+
+    for loc, lastmod in children:
+        if lastmod is not None and sitemaps.lastmod(country, loc) == lastmod:
+            stats['sitemaps_skipped'] += 1
+            continue
+        entries = job_links(parse_sitemap(session.get(loc).content), country)
+        stats['sitemaps_read'] += 1
+        _queue_changes(country, entries, seen, queue, now, stats)
+        sitemaps.save(country, loc, lastmod)
+
+    print(f"[{country}] Read {stats['sitemaps_read']} sitemaps, skipped {stats['sitemaps_skipped']} unchanged; "
+          f"queued {stats['new']} new and {stats['changed']} changed jobs")
+    return stats
+
+
+def _queue_changes(country, entries, seen, queue, now, stats):
+    if not entries:
+        return
+    scraped = seen.scraped_at(job_id_from_link(loc) for loc, _ in entries)
+    links, priorities = [], []
+    for loc, lastmod in entries:
+        changed = parse_lastmod(lastmod)
+        last_scrape = scraped.get(job_id_from_link(loc))
+        if last_scrape is not None and (changed is None or changed <= last_scrape):
+            continue
+        stats['changed' if last_scrape is not None else 'new'] += 1
+        links.append(loc)
+        priorities.append(age_priority((now - changed).total_seconds() / 86400 if changed else None,
+                                       last_scrape is not None))
+    queue.enqueue(country, links, priorities)
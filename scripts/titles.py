@@ -0,0 +1,406 @@
+# Title normalization engine for the cleaning steps
+import hashlib
+import json
+import re
+import sqlite3
+from bisect import bisect_left
+from collections import deque
+
+import pandas as pd
+
+from scripts.utils import data_path
+
+TITLE_DB = data_path('titles.db')
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+_REPEATS = tuple(getattr(sre_constants, name) for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+                 if hasattr(sre_constants, name))
+
+
+def required_literals(pattern):
+    """
+    Finds literal strings one of which appears in every text the pattern matches (`re.search` semantics).
+
+    The parsed pattern is walked: a run of literal characters is required, so is the content of a positive
+    lookaround or of a repeat of at least one, and an alternation requires one of the literals of each branch.
+    Of the requirements of a sequence the most selective (longest shortest literal) is kept.
+
+    Args:
+        pattern (str): The regular expression.
+
+    Returns:
+        frozenset or None: The literals, or None if no literal is required (or the pattern ignores case).
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    return _sequence_literals(parsed)
+
+
+def _sequence_literals(items):
+    candidates = []
+    run = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            candidates.append(frozenset([''.join(run)]))
+            run = []
+        literals = _item_literals(op, av)
+        if literals is not None:
+            candidates.append(literals)
+    if run:
+        candidates.append(frozenset([''.join(run)]))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda literals: (min(map(len, literals)), -len(literals)))
+
+
+def _item_literals(op, av):
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, items = av
+        if (add_flags | del_flags) & sre_constants.SRE_FLAG_IGNORECASE:
+            return None
+        return _sequence_literals(items)
+    if op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+        return _sequence_literals(av)
+    if op in _REPEATS:
+        low, _, items = av
+        return _sequence_literals(items) if low >= 1 else None
+    if op is sre_constants.ASSERT:
+        return _sequence_literals(av[1])
+    if op is sre_constants.BRANCH:
+        literals = set()
+        for branch in av[1]:
+            branch_literals = _sequence_literals(branch)
+            if branch_literals is None:
+                return None
+            literals |= branch_literals
+        return frozenset(literals)
+    return None
+
+
+class LiteralIndex:
+    """
+    An Aho-Corasick automaton over a set of literal strings, finding all of them that occur in a text in one pass.
+
+    Args:
+        literals (iterable): The literal strings (non-empty).
+    """
+
+    def __init__(self, literals):
+        self.literals = list(dict.fromkeys(literals))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for number, literal in enumerate(self.literals):
+            node = 0
+            for char in literal:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].add(number)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] |= self._out[self._fail[child]]
+
+    def find(self, text):
+        """
+        Finds the literals occurring in a text.
+
+        Args:
+            text (str): The text to search.
+
+        Returns:
+            set: The literals found.
+        """
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found |= self._out[node]
+        return {self.literals[number] for number in found}
+
+
+class TitleMapper:
+    """
+    Applies a title mapping (pattern -> replacement) as `edit_title` always has, resolving each distinct title once.
+
+    The semantics are those of running the patterns in order over the whole column: a title matching a pattern
+    becomes its replacement, and later patterns are tried on that replacement, so the last pattern to match wins.
+    Instead of one pass over the column per pattern, each distinct title walks the mapping once: a literal
+    prefilter (see `required_literals` and `LiteralIndex`) picks the patterns that can match it, only those are
+    tried, in order, and the walk jumps from match to match. The rest of a walk after a match only depends on the
+    pattern that matched, so it is computed once per pattern.
+
+    Args:
+        title_mapping (dict): Patterns (lower-cased before compiling) and their replacements, in order.
+        patterns_replace (str, optional): A pattern removed from every title before mapping. Defaults to ''.
+    """
+
+    def __init__(self, title_mapping, patterns_replace=''):
+        self.keys = list(title_mapping)
+        self.patterns = [pattern.lower() for pattern in title_mapping]
+        self.replacements = [replacement.lower() for replacement in title_mapping.values()]
+        self.patterns_replace = patterns_replace
+        self._compiled = [re.compile(pattern) for pattern in self.patterns]
+
+        self._always = []
+        self._by_literal = {}
+        for number, pattern in enumerate(self.patterns):
+            literals = required_literals(pattern)
+            if literals is None:
+                self._always.append(number)
+            else:
+                for literal in literals:
+                    self._by_literal.setdefault(literal, []).append(number)
+        self._index = LiteralIndex(self._by_literal)
+        self._walks = {}
+
+    def candidates(self, title):
+        """
+        Lists the patterns that may match a title, in mapping order.
+
+        Args:
+            title (str): The prepared (lower-cased) title.
+
+        Returns:
+            list: The pattern numbers.
+        """
+        numbers = set(self._always)
+        for literal in self._index.find(title):
+            numbers.update(self._by_literal[literal])
+        return sorted(numbers)
+
+    def chain(self, title, start=0):
+        """
+        Follows a title through the mapping.
+
+        Args:
+            title (str): The prepared (lower-cased) title.
+            start (int, optional): The number of the first pattern to try. Defaults to 0.
+
+        Returns:
+            list: The numbers of the patterns that matched, in order; the last one gave the result.
+        """
+        candidates = self.candidates(title)
+        for number in candidates[bisect_left(candidates, start):]:
+            if self._compiled[number].search(title):
+                if number not in self._walks:
+                    self._walks[number] = self.chain(self.replacements[number], number + 1)
+                return [number] + self._walks[number]
+        return []
+
+    def resolve(self, title):
+        """
+        Maps a prepared title.
+
+        Args:
+            title (str): The prepared (lower-cased) title.
+
+        Returns:
+            str: The mapped title, still lower-cased.
+        """
+        matched = self.chain(title)
+        return self.replacements[matched[-1]] if matched else title
+
+    def prepare(self, titles):
+        """
+        Lower-cases and strips titles and removes `patterns_replace`, as `edit_title` does before mapping.
+
+        Args:
+            titles (pd.Series): The raw titles.
+
+        Returns:
+            pd.Series: The prepared titles.
+        """
+        titles = titles.str.lower().str.strip()
+        if self.patterns_replace:
+            titles = titles.str.replace(self.patterns_replace, '', regex=True).str.strip()
+        return titles
+
+    def normalize(self, titles):
+        """
+        Maps a column of titles, each distinct title once.
+
+        Args:
+            titles (pd.Series): The raw titles.
+
+        Returns:
+            pd.Series: The mapped, title-cased titles, aligned with `titles`.
+        """
+        unique = pd.Series(titles.dropna().unique())
+        mapped = self.prepare(unique).map(self.resolve).str.title()
+        return titles.map(dict(zip(unique, mapped)))
+
+
+def mapping_version(title_mapping, patterns_replace=''):
+    """
+    Fingerprints a title mapping: its patterns and replacements in order, and the pattern removed beforehand.
+
+    Args:
+        title_mapping (dict): Patterns and their replacements, in order.
+        patterns_replace (str, optional): A pattern removed from every title before mapping. Defaults to ''.
+
+    Returns:
+        str: The version, a hex digest.
+    """
+    content = json.dumps([list(title_mapping.items()), patterns_replace], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def changed_patterns(old_mapping, new_mapping):
+    """
+    Lists the patterns added, removed or given another replacement between two versions of a mapping.
+
+    Args:
+        old_mapping (dict): The previous mapping.
+        new_mapping (dict): The current mapping.
+
+    Returns:
+        set or None: The changed patterns, or None if patterns kept by both were reordered (every title may change).
+    """
+    kept = [pattern for pattern in old_mapping if pattern in new_mapping]
+    if kept != [pattern for pattern in new_mapping if pattern in old_mapping]:
+        return None
+    changed = {pattern for pattern in old_mapping if old_mapping[pattern] != new_mapping.get(pattern)}
+    return changed | {pattern for pattern in new_mapping if pattern not in old_mapping}
+
+
+class TitleStore:
+    """
+    Normalized titles stored in SQLite per mapping name, so a change to a mapping only re-resolves the titles it
+    can affect instead of the whole table.
+
+    Every distinct raw title is stored with its prepared form, the chain of patterns it matched (the last being
+    the winning pattern), its mapped title and the mapping version it was resolved with. When the mapping changes,
+    the titles whose walk — the prepared title and the replacements along its chain — is matched by the old or new
+    version of an added, removed or edited pattern are resolved again; for the others the walk cannot change.
+    Reordering kept patterns, or changing `patterns_replace`, resolves everything. `stats` describes the last call.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to TITLE_DB.
+    """
+
+    def __init__(self, path=TITLE_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS mappings (name TEXT PRIMARY KEY, version TEXT, mapping TEXT, '
+            'patterns_replace TEXT)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS titles (name TEXT, raw TEXT, prepared TEXT, chain TEXT, pattern TEXT, '
+            'title TEXT, version TEXT, PRIMARY KEY (name, raw))'
+        )
+        self.conn.commit()
+        self.stats = {}
+
+    def mapping(self, name):
+        """
+        Returns the mapping a name was last normalized with.
+
+        Args:
+            name (str): The mapping name (e.g. 'egypt').
+
+        Returns:
+            tuple or None: (mapping, patterns_replace, version), or None if the name is unknown.
+        """
+        row = self.conn.execute(
+            'SELECT mapping, patterns_replace, version FROM mappings WHERE name = ?', (name,)
+        ).fetchone()
+        return (dict(json.loads(row[0])), row[1], row[2]) if row else None
+
+    def normalize(self, name, titles, title_mapping, patterns_replace=''):
+        """
+        Maps titles like `TitleMapper.normalize`, re-resolving only the stored titles a mapping change affects.
+
+        All stored titles of the name are brought to the current mapping version, not only those passed in.
+
+        Args:
+            name (str): The mapping name (e.g. 'egypt').
+            titles (pd.Series): The raw titles.
+            title_mapping (dict): Patterns and their replacements, in order.
+            patterns_replace (str, optional): A pattern removed from every title before mapping. Defaults to ''.
+
+        Returns:
+            pd.Series: The mapped, title-cased titles, aligned with `titles`.
+        """
+        version = mapping_version(title_mapping, patterns_replace)
+        mapper = TitleMapper(title_mapping, patterns_replace)
+        stored = {raw: (prepared, json.loads(chain), title) for raw, prepared, chain, title in self.conn.execute(
+            'SELECT raw, prepared, chain, title FROM titles WHERE name = ?', (name,)
+        )}
+
+        previous = self.mapping(name)
+        changed = None
+        if previous is not None and previous[1] == patterns_replace:
+            changed = changed_patterns(previous[0], title_mapping)
+        if changed is None:
+            stale = set(stored)
+        elif previous[2] == version:
+            stale = set()
+        else:
+            stale = self._affected(stored, previous[0], changed)
+
+        unique = pd.Series(titles.dropna().unique())
+        new = unique[~unique.isin(stored.keys())]
+        pending = pd.Series(list(stale) + new.tolist(), dtype=object)
+        prepared = mapper.prepare(pending)
+        rows = []
+        for raw, title in zip(pending, prepared):
+            chain = mapper.chain(title)
+            keys = [mapper.keys[number] for number in chain]
+            result = (mapper.replacements[chain[-1]] if chain else title).title()
+            stored[raw] = (title, keys, result)
+            rows.append((name, raw, title, json.dumps(keys, ensure_ascii=False), keys[-1] if keys else None, result,
+                         version))
+
+        self.conn.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self.conn.execute('UPDATE titles SET version = ? WHERE name = ?', (version, name))
+        self.conn.execute(
+            'INSERT OR REPLACE INTO mappings VALUES (?, ?, ?, ?)',
+            (name, version, json.dumps(list(title_mapping.items()), ensure_ascii=False), patterns_replace)
+        )
+        self.conn.commit()
+        self.stats = {'titles': len(stored), 'changed_patterns': None if changed is None else len(changed),
+                      'resolved': len(rows), 'new': len(new)}
+        return titles.map({raw: title for raw, (_, _, title) in stored.items()})
+
+    @staticmethod
+    def _affected(stored, old_mapping, changed):
+        compiled = [re.compile(pattern.lower()) for pattern in changed]
+        matches = {}
+
+        def hit(text):
+            if text not in matches:
+                matches[text] = any(pattern.search(text) for pattern in compiled)
+            return matches[text]
+
+        replacements = {pattern: replacement.lower() for pattern, replacement in old_mapping.items()}
+        return {raw for raw, (prepared, chain, _) in stored.items()
+                if hit(prepared) or any(hit(replacements[pattern]) for pattern in chain)}
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
@@ -0,0 +1,446 @@
+# Cached translation for the cleaning steps
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from deep_translator import GoogleTranslator
+
+from scripts.dedup import fold_text
+from scripts.fetcher import TokenBucket
+from scripts.utils import data_path
+
+TRANSLATION_DB = data_path('translations.db')
+
+# The tiers a text can be translated by, in the order they are tried; the last keeps the original text.
+TIERS = ('glossary', 'cache', 'backend', 'fallback')
+
+# Common Arabic job titles of bayt.com postings and their English titles, matched on the whole text.
+TITLE_GLOSSARY = {
+    'محاسب': 'Accountant',
+    'محاسب عام': 'General Accountant',
+    'رئيس حسابات': 'Chief Accountant',
+    'مدير مالي': 'Financial Manager',
+    'مراجع حسابات': 'Auditor',
+    'مدير مبيعات': 'Sales Manager',
+    'مندوب مبيعات': 'Sales Representative',
+    'مسؤول مبيعات': 'Sales Officer',
+    'مشرف مبيعات': 'Sales Supervisor',
+    'اخصائي مبيعات': 'Sales Specialist',
+    'مدير تسويق': 'Marketing Manager',
+    'اخصائي تسويق': 'Marketing Specialist',
+    'اخصائي تسويق الكتروني': 'Digital Marketing Specialist',
+    'خدمة عملاء': 'Customer Service',
+    'ممثل خدمة عملاء': 'Customer Service Representative',
+    'موظف خدمة عملاء': 'Customer Service Agent',
+    'سكرتير': 'Secretary',
+    'سكرتيرة': 'Secretary',
+    'سكرتير تنفيذي': 'Executive Secretary',
+    'موظف استقبال': 'Receptionist',
+    'مدخل بيانات': 'Data Entry Clerk',
+    'اداري': 'Administrator',
+    'مدير اداري': 'Administrative Manager',
+    'مساعد اداري': 'Administrative Assistant',
+    'مدير موارد بشرية': 'HR Manager',
+    'اخصائي موارد بشرية': 'HR Specialist',
+    'اخصائي توظيف': 'Recruitment Specialist',
+    'مهندس مدني': 'Civil Engineer',
+    'مهندس كهرباء': 'Electrical Engineer',
+    'مهندس ميكانيكا': 'Mechanical Engineer',
+    'مهندس معماري': 'Architect',
+    'مهندس موقع': 'Site Engineer',
+    'مهندس مبيعات': 'Sales Engineer',
+    'مهندس برمجيات': 'Software Engineer',
+    'مطور برمجيات': 'Software Developer',
+    'مطور ويب': 'Web Developer',
+    'مصمم جرافيك': 'Graphic Designer',
+    'فني': 'Technician',
+    'فني صيانة': 'Maintenance Technician',
+    'فني كهرباء': 'Electrician',
+    'سائق': 'Driver',
+    'امين مخزن': 'Storekeeper',
+    'مدير مشتريات': 'Purchasing Manager',
+    'مسؤول مشتريات': 'Purchasing Officer',
+    'مدير مشروع': 'Project Manager',
+    'مدير مشاريع': 'Project Manager',
+    'مدير فرع': 'Branch Manager',
+    'مدير عام': 'General Manager',
+    'مدير عمليات': 'Operations Manager',
+    'مشرف': 'Supervisor',
+    'معلم': 'Teacher',
+    'معلمة': 'Teacher',
+    'مدرس': 'Teacher',
+    'مدرسة': 'Teacher',
+    'ممرض': 'Nurse',
+    'ممرضة': 'Nurse',
+    'طبيب': 'Doctor',
+    'صيدلي': 'Pharmacist',
+    'مندوب دعاية طبية': 'Medical Representative',
+    'محامي': 'Lawyer',
+    'مستشار قانوني': 'Legal Counsel',
+    'كاشير': 'Cashier',
+    'طباخ': 'Cook',
+    'شيف': 'Chef',
+    'حارس امن': 'Security Guard',
+    'عامل': 'Worker',
+}
+
+_default_cache = None
+
+
+def translation_key(text):
+    """
+    Normalizes a source text into its cache key, so spelling variants of one text share a translation: Unicode
+    NFKC, Arabic diacritics and tatweel removed, letter variants unified, lower-cased and whitespace collapsed.
+
+    Args:
+        text (str): The source text.
+
+    Returns:
+        str: The cache key.
+    """
+    return ' '.join(fold_text(unicodedata.normalize('NFKC', text)).split())
+
+
+class TranslationCache:
+    """
+    Translations stored in SQLite, keyed by language pair and normalized source text, so a text is sent to the
+    translation backend once across all runs.
+
+    The stored translations of a language pair are loaded into memory the first time the pair is used (or by
+    `warm`), so lookups do not query the database. `hits` and `misses` count the distinct texts looked up.
+
+    Args:
+        path (str, optional): The SQLite database file. Defaults to TRANSLATION_DB.
+    """
+
+    def __init__(self, path=TRANSLATION_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS translations ('
+            'source_lang TEXT, target_lang TEXT, key TEXT, source TEXT, translation TEXT, translated_at TEXT, '
+            'PRIMARY KEY (source_lang, target_lang, key))'
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def warm(self, source='ar', target='en'):
+        """
+        Loads the stored translations of a language pair into memory.
+
+        Args:
+            source (str, optional): The source language. Defaults to 'ar'.
+            target (str, optional): The target language. Defaults to 'en'.
+
+        Returns:
+            int: The number of translations loaded.
+        """
+        rows = self.conn.execute(
+            'SELECT key, translation FROM translations WHERE source_lang = ? AND target_lang = ?', (source, target)
+        )
+        with self._lock:
+            self._memory[source, target] = dict(rows)
+            return len(self._memory[source, target])
+
+    def get_many(self, keys, source='ar', target='en'):
+        """
+        Looks up the translations of several texts.
+
+        Args:
+            keys (iterable): Cache keys from `translation_key`.
+            source (str, optional): The source language. Defaults to 'ar'.
+            target (str, optional): The target language. Defaults to 'en'.
+
+        Returns:
+            dict: The translation of every key found.
+        """
+        if (source, target) not in self._memory:
+            self.warm(source, target)
+        with self._lock:
+            memory = self._memory[source, target]
+            found = {key: memory[key] for key in keys if key in memory}
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, translations, source='ar', target='en'):
+        """
+        Stores translations.
+
+        Args:
+            translations (list): (key, source_text, translation) tuples.
+            source (str, optional): The source language. Defaults to 'ar'.
+            target (str, optional): The target language. Defaults to 'en'.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)',
+            [(source, target, key, text, translation, now) for key, text, translation in translations]
+        )
+        self.conn.commit()
+        with self._lock:
+            memory = self._memory.setdefault((source, target), {})
+            memory.update((key, translation) for key, _, translation in translations)
+
+    def stats(self):
+        """
+        Summarizes the lookups so far.
+
+        Returns:
+            dict: The hits, misses, hit rate and number of stored translations.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0],
+        }
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.conn.close()
+
+
+def default_cache():
+    """
+    Returns the translation cache shared by the cleaning functions of this process, opened on first use.
+
+    Returns:
+        TranslationCache: The cache in TRANSLATION_DB.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranslationCache()
+    return _default_cache
+
+
+def google_batch(source='ar', target='en'):
+    """
+    Returns the default translation backend: Google Translate, one request per batch.
+
+    A batch is sent as one text, one line per entry, and split back into lines. If the line count does not match
+    (or an entry holds a line break) the batch is translated one entry at a time instead. Each calling thread uses
+    its own translator, so concurrent batches do not mix.
+
+    Args:
+        source (str, optional): The source language. Defaults to 'ar'.
+        target (str, optional): The target language. Defaults to 'en'.
+
+    Returns:
+        callable: Takes a list of texts and returns their translations, None for an entry that failed.
+    """
+    local = threading.local()
+
+    def translate(batch):
+        # GoogleTranslator keeps the text of the current call on the instance, so each thread needs its own.
+        if not hasattr(local, 'translator'):
+            local.translator = GoogleTranslator(source=source, target=target)
+        translator = local.translator
+        if not any('\n' in text for text in batch):
+            lines = (translator.translate('\n'.join(batch)) or '').split('\n')
+            if len(lines) == len(batch):
+                return [line.strip() or None for line in lines]
+        return per_text(translator.translate)(batch)
+
+    return translate
+
+
+def per_text(translate):
+    """
+    Turns a one-text translation function into a batch backend.
+
+    Args:
+        translate (callable): Takes a text and returns its translation.
+
+    Returns:
+        callable: Takes a list of texts and returns their translations, None for a text whose call failed.
+    """
+    def translate_batch(batch):
+        translations = []
+        for text in batch:
+            try:
+                translations.append(translate(text))
+            except Exception:
+                translations.append(None)
+        return translations
+
+    return translate_batch
+
+
+class FakeBackend:
+    """
+    A local stand-in for the translation backend, for tests and benchmarks.
+
+    Translates from a dictionary, or tags unknown texts with the target language, after a fixed latency per batch;
+    every `fail_every`-th batch raises instead. The batches received are kept in `batches`.
+
+    Args:
+        translations (dict, optional): Known translations. Defaults to None.
+        target (str, optional): The tag of unknown texts. Defaults to 'en'.
+        latency (float, optional): Seconds slept per batch. Defaults to 0.
+        fail_every (int, optional): Fail every n-th batch; 0 never fails. Defaults to 0.
+    """
+
+    def __init__(self, translations=None, target='en', latency=0.0, fail_every=0):
+        self.translations = translations or {}
+        self.target = target
+        self.latency = latency
+        self.fail_every = fail_every
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            self.batches.append(list(batch))
+            number = len(self.batches)
+        time.sleep(self.latency)
+        if self.fail_every and number % self.fail_every == 0:
+            raise RuntimeError(f'Injected failure of batch {number}')
+        return [self.translations.get(text, f'[{self.target}] {text}') for text in batch]
+
+
+class TranslationService:
+    """
+    Translates texts through tiers, each distinct text going to the cheapest tier that knows it.
+
+    1. glossary: an exact, then normalized, match in a job-title glossary (offline, no request).
+    2. cache: a translation stored by an earlier run (see TranslationCache).
+    3. backend: the remaining distinct texts, in batches of `batch_size` texts and at most `max_chars` characters,
+       sent by `max_workers` threads at no more than `rate` batches per second. Results are cached.
+    4. fallback: texts the backend failed on, or did not reach within `time_budget`, keep their original text and
+       are tried again next time.
+
+    `counters` counts the distinct texts served by each tier over the service's lifetime.
+
+    Args:
+        backend (callable, optional): Takes a list of texts and returns their translations (None for a failed
+            entry). Defaults to `google_batch(source, target)`.
+        source (str, optional): The source language. Defaults to 'ar'.
+        target (str, optional): The target language. Defaults to 'en'.
+        glossary (dict, optional): Source phrases and their translations. Defaults to TITLE_GLOSSARY.
+        cache (TranslationCache, optional): The cache. Defaults to `default_cache()`.
+        batch_size (int, optional): The maximum number of texts per backend call. Defaults to 25.
+        max_chars (int, optional): The maximum number of characters per backend call. Defaults to 4500.
+        max_workers (int, optional): The number of concurrent backend calls. Defaults to 4.
+        rate (float, optional): The maximum number of backend calls per second, or None for no limit.
+            Defaults to 5.
+        time_budget (float, optional): Seconds after which a `translate` call starts no more backend batches.
+            Defaults to None (no limit).
+    """
+
+    def __init__(self, backend=None, source='ar', target='en', glossary=None, cache=None, batch_size=25,
+                 max_chars=4500, max_workers=4, rate=5.0, time_budget=None):
+        self.backend = backend if backend is not None else google_batch(source, target)
+        self.source = source
+        self.target = target
+        self.glossary = TITLE_GLOSSARY if glossary is None else glossary
+        self._glossary_keys = {translation_key(phrase): translation for phrase, translation in self.glossary.items()}
+        self.cache = cache if cache is not None else default_cache()
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.max_workers = max_workers
+        self.limiter = TokenBucket(rate=rate, burst=1.0, max_rate=rate) if rate else None
+        self.time_budget = time_budget
+        self.counters = dict.fromkeys(TIERS, 0)
+
+    def _batches(self, items):
+        batch, chars = [], 0
+        for key, text in items:
+            if batch and (len(batch) == self.batch_size or chars + len(text) > self.max_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append((key, text))
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def translate(self, texts):
+        """
+        Translates texts, each distinct text once.
+
+        Args:
+            texts (iterable): The texts to translate.
+
+        Returns:
+            dict: The translation of every distinct text (its original text if no tier translated it).
+        """
+        texts = set(texts)
+        translations = {}
+        keys = {}
+        for text in texts:
+            translation = self.glossary.get(text)
+            if translation is None:
+                keys[text] = translation_key(text)
+                translation = self._glossary_keys.get(keys[text])
+            if translation is not None:
+                translations[text] = translation
+                self.counters['glossary'] += 1
+
+        found = self.cache.get_many({key for text, key in keys.items() if text not in translations},
+                                    self.source, self.target)
+        self.counters['cache'] += len(found)
+        missing = {}
+        for text, key in keys.items():
+            if text not in translations and key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            found.update(self._translate_missing(missing))
+        for text, key in keys.items():
+            if text not in translations:
+                translations[text] = found.get(key, text)
+        return translations
+
+    def _translate_missing(self, missing):
+        deadline = time.monotonic() + self.time_budget if self.time_budget is not None else None
+
+        def run(batch):
+            if deadline is not None and time.monotonic() >= deadline:
+                return batch, None
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                results = self.backend([text for _, text in batch])
+            except Exception:
+                return batch, None
+            return batch, results if results is not None and len(results) == len(batch) else None
+
+        translated = []
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for batch, results in executor.map(run, self._batches(missing.items())):
+                for (key, text), translation in zip(batch, results or [None] * len(batch)):
+                    if translation:
+                        translated.append((key, text, translation))
+        self.cache.put_many(translated, self.source, self.target)
+        self.counters['backend'] += len(translated)
+        self.counters['fallback'] += len(missing) - len(translated)
+        return {key: translation for key, _, translation in translated}
+
+
+def translate_texts(texts, source='ar', target='en', cache=None, translate=None):
+    """
+    Translates texts with a one-off TranslationService, sending only the distinct, uncached texts to the backend.
+
+    A text whose translation fails is kept as is and not cached, so a later run tries it again.
+
+    Args:
+        texts (iterable): The texts to translate.
+        source (str, optional): The source language. Defaults to 'ar'.
+        target (str, optional): The target language. Defaults to 'en'.
+        cache (TranslationCache, optional): The cache. Defaults to `default_cache()`.
+        translate (callable, optional): A backend taking one text and returning its translation.
+            Defaults to Google Translate in batches (see `google_batch`).
+
+    Returns:
+        dict: The translation of every distinct text.
+    """
+    backend = per_text(translate) if translate is not None else None
+    return TranslationService(backend, source, target, cache=cache).translate(texts)
@@ -1 +1,34 @@
 # Helper functions here
+import multiprocessing
+import os
+
+# The repository's data folder, resolved from this file so the defaults hold wherever the code is run from.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def data_path(*parts):
+    """
+    Builds a path inside the repository's data folder.
+
+    Args:
+        *parts (str): The path components below `data/`.
+
+    Returns:
+        str: The absolute path.
+    """
+    return os.path.join(DATA_DIR, *parts)
+
+
+def process_context():
+    """
+    Returns the multiprocessing context for worker pools: 'forkserver' where the platform has it, else 'spawn'.
+
+    The scraper starts its pools from threaded code holding sockets, SQLite connections and locks, which a forked
+    child would inherit in whatever state another thread left them. Workers started from a clean server process
+    inherit none of it.
+
+    Returns:
+        multiprocessing.context.BaseContext: The context to pass as `mp_context`.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
@@ -0,0 +1,68 @@
+# Shared helpers for the tests
+import ast
+import random
+import re
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+NOTEBOOKS = ROOT / 'python_notebooks'
+
+
+def notebook_value(notebook, name):
+    """
+    Reads a literal assigned in a cleaning notebook script, e.g. its title mapping.
+
+    Args:
+        notebook (str): The script name in python_notebooks, without extension.
+        name (str): The assigned name.
+
+    Returns:
+        object: The value of the first assignment to `name`.
+    """
+    tree = ast.parse((NOTEBOOKS / f'{notebook}.py').read_text(encoding='utf-8'))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, 'id', None) == name for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise KeyError(name)
+
+
+def synthetic_titles(words, count, seed=0, extra=()):
+    """
+    Builds titles from random runs of words, mixed with the given extra titles.
+
+    Args:
+        words (iterable): The words to draw from.
+        count (int): The number of titles.
+        seed (int, optional): The random seed. Defaults to 0.
+        extra (iterable, optional): Titles drawn as a whole one time in five. Defaults to ().
+
+    Returns:
+        pd.Series: The titles.
+    """
+    rng = random.Random(seed)
+    words, extra = sorted(set(words)), list(extra)
+    titles = []
+    for _ in range(count):
+        if extra and rng.random() < 0.2:
+            titles.append(rng.choice(['', 'Senior ', 'Sr. ', 'junior ']) + rng.choice(extra).upper())
+        else:
+            titles.append(' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))))
+    return pd.Series(titles)
+
+
+def pattern_words(texts):
+    """
+    Splits regular expressions and replacements into the words they mention.
+
+    Args:
+        texts (iterable): The texts.
+
+    Returns:
+        set: The words.
+    """
+    return {word for text in texts for word in re.findall(r'[^\W\d_]+|/|-', text.lower())}
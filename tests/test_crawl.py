@@ -0,0 +1,102 @@
+import gzip
+
+import pandas as pd
+import pytest
+import requests
+
+from benchmarks.corpus import synthesize
+from benchmarks.server import StandInServer
+from scripts.crawl_metrics import CrawlMetrics
+from scripts.crawl_store import Checkpoints, DetailQueue, SeenJobs
+from scripts.extractor import JOB_FIELDS, extract_job
+from scripts.fetcher import ScraperSession
+from scripts.scrape_jobs import backfill_details, scrapping
+
+
+class CrashingSession(ScraperSession):
+    """A session that raises `error` once, when it first requests `crash_url`; by default as a killed process would."""
+
+    def __init__(self, crash_url, error=RuntimeError('Injected crash')):
+        super().__init__(max_retries=0)
+        self.crash_url = crash_url
+        self.error = error
+
+    def get(self, url, **kwargs):
+        if url == self.crash_url:
+            self.crash_url = None
+            raise self.error
+        return super().get(url, **kwargs)
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    return synthesize(str(tmp_path_factory.mktemp('corpus')), listing_pages=2, per_page=5)
+
+
+@pytest.fixture(scope='module')
+def server(corpus):
+    with StandInServer(corpus) as server:
+        yield server
+
+
+def crawl(corpus, server, tmp_path, output, **options):
+    state = str(tmp_path / 'state.db')
+    options.setdefault('session', ScraperSession(max_retries=0))
+    return scrapping(corpus.country, corpus.listing_pages, base_url=server.base_url, max_workers=4, per_host=4,
+                     seen=SeenJobs(state), checkpoints=Checkpoints(state), queue=DetailQueue(state), parse_workers=0,
+                     output=output, **options)
+
+
+def detail_links(corpus, server):
+    return [server.base_url + path for path, entry in corpus.pages.items() if entry['kind'] == 'detail']
+
+
+def test_rows_in_listing_order(corpus, server, tmp_path):
+    output = str(tmp_path / 'raw.csv')
+    assert crawl(corpus, server, tmp_path, output) == 10
+
+    assert pd.read_csv(output, encoding='utf-8-sig').link.tolist() == detail_links(corpus, server)
+
+
+def test_csv_matches_pandas(corpus, server, tmp_path):
+    output = str(tmp_path / 'raw.csv')
+    crawl(corpus, server, tmp_path, output)
+
+    rows = [extract_job(gzip.decompress(corpus.get(link[len(server.base_url):])).decode('utf-8'), link)
+            for link in detail_links(corpus, server)]
+    expected = pd.DataFrame(rows, columns=JOB_FIELDS).to_csv(index=False)
+    with open(output, 'rb') as file:
+        assert file.read() == expected.encode('utf-8-sig')
+
+
+def test_resume_after_crash(corpus, server, tmp_path):
+    (tmp_path / 'complete').mkdir()
+    complete = str(tmp_path / 'complete' / 'raw.csv')
+    crawl(corpus, server, tmp_path / 'complete', complete)
+
+    output = str(tmp_path / 'raw.csv')
+    with pytest.raises(RuntimeError, match='Injected crash'):
+        crawl(corpus, server, tmp_path, output, session=CrashingSession(detail_links(corpus, server)[7]))
+    assert crawl(corpus, server, tmp_path, output, resume=True) == 5
+
+    with open(output, 'rb') as resumed, open(complete, 'rb') as expected:
+        assert resumed.read() == expected.read()
+
+
+def test_failed_detail_page_is_queued(corpus, server, tmp_path):
+    links = detail_links(corpus, server)
+    output = str(tmp_path / 'raw.csv')
+    metrics = CrawlMetrics()
+    session = CrashingSession(links[3], requests.ConnectionError('Injected connection error'))
+    assert crawl(corpus, server, tmp_path, output, session=session, metrics=metrics) == 9
+
+    queue = DetailQueue(str(tmp_path / 'state.db'))
+    assert queue.peek(corpus.country) == [links[3]]
+    assert metrics.summary()['pages']['detail']['failed_pages'] == 1
+    assert 'scraper_failed_pages_total{kind="detail"} 1' in metrics.prometheus()
+
+    state = str(tmp_path / 'state.db')
+    assert backfill_details(corpus.country, session=ScraperSession(max_retries=0), seen=SeenJobs(state), queue=queue,
+                            output=output) == 1
+    assert sorted(pd.read_csv(output, encoding='utf-8-sig').link) == sorted(links)
+    assert queue.count(corpus.country) == 0
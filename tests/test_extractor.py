@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from benchmarks.corpus import synthesize
+from scripts.extractor import DetailStream, extract_job, extract_links
+
+BASE_URL = 'https://www.bayt.com'
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    return synthesize(str(tmp_path_factory.mktemp('corpus')), listing_pages=2, per_page=5)
+
+
+def pages(corpus, kind):
+    return [(path, gzip.decompress(corpus.get(path)).decode('utf-8'))
+            for path, entry in corpus.pages.items() if entry['kind'] == kind]
+
+
+def streamed(html, link, chunk_size):
+    stream = DetailStream(link)
+    data = html.encode('utf-8')
+    for i in range(0, len(data), chunk_size):
+        if stream.feed(data[i:i + chunk_size]):
+            break
+    return stream.job()
+
+
+def test_links_match_across_parsers(corpus):
+    for path, html in pages(corpus, 'listing'):
+        links = extract_links(html, BASE_URL, 'lxml')
+        assert len(links) == 5
+        assert links == extract_links(html, BASE_URL, 'html5lib'), path
+
+
+@pytest.mark.parametrize('chunk_size', [512, 65536])
+def test_jobs_match_across_parsers(corpus, chunk_size):
+    for path, html in pages(corpus, 'detail'):
+        link = BASE_URL + path
+        job = extract_job(html, link, 'html5lib')
+        assert job['title'], path
+        assert extract_job(html, link, 'lxml') == job, path
+        assert streamed(html, link, chunk_size) == job, path
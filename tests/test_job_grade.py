@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from conftest import synthetic_titles
+from scripts.clean_data import GRADE_KEYWORDS, extract_job_grade
+
+WORDS = [word for keywords in GRADE_KEYWORDS.values() for keyword in keywords if '(' not in keyword
+         for word in keyword.split()] + ['sr', 'sr.', 'assistant', 'accountant', 'engineer', 'sales', '-', ',', '- ',
+                                         'i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii', 'level']
+
+
+def loop_job_grade(df, column='title'):
+    """The original `extract_job_grade`: one scan of the column per rule, later matches overwriting earlier ones."""
+    df[column].fillna('Unknown', inplace=True)
+
+    mapping_dict0 = {'Graduate': 'i', 'Junior': 'ii', 'Mid Level': 'iii', 'Senior': 'iv',
+                     'Management': 'v', 'Senior Management': 'vi', 'C-Suite': 'vii'}
+    mapping_dict = {
+        'Graduate': ['trainee', 'intern', 'entry-level', 'graduate', 'internship', 'interns', 'تمهير', 'تدريب'],
+        'Junior': ['junior'],
+        'Mid Level': ['mid-level', 'intermediate'],
+        'Senior': ['senior', 'supervisor', 'section head', r'(^sr(\b|\s)|\ssr(\b|\s))', 'senior associate'],
+        'Management': ['manager', 'principal', 'assistant director'],
+        'Senior Management': ['senior manager', 'director', 'vice president', 'svp', 'group manager'],
+        'C-Suite': ['c-suite', 'ceo', 'chief executive officer', 'cfo', 'chief financial officer',
+                    'cio', 'chief information officer', 'coo', 'chief operating officer',
+                    'cto', 'chief technology officer', 'cmo', 'chief marketing officer']
+    }
+    mappings = [
+        mapping_dict0,
+        mapping_dict
+    ]
+    for i in [0, 1]:
+        for key in mappings[i]:
+            regex = r'\b|'.join(mappings[i][key]) + r'\b' if i else rf'(\s|-){mappings[i][key]}($|\s|\,|- )'
+            if key == 'Senior Management' and i:
+                regex = r'(?<!\bassistant\s)\bdirector\b|' + r'\b|'.join(mappings[i][key][1:]) + r'\b'
+            mask = df[column].str.contains(regex, regex=True)
+            if key == 'Graduate':
+                df.loc[mask, 'type'] = 'Intern'
+            if key == 'Management' or key == 'Senior Management' or key == 'C-Suite':
+                df.loc[mask, 'type'] = 'Management'
+            df.loc[mask, 'job_level'] = key
+
+
+def postings(count=6000):
+    titles = synthetic_titles(WORDS, count, extra=[keyword for keywords in GRADE_KEYWORDS.values()
+                                                   for keyword in keywords if '(' not in keyword])
+    titles[::97] = None
+    return pd.DataFrame({'title': titles, 'type': ['Full Time', 'Part Time', None] * (count // 3)})
+
+
+@pytest.mark.parametrize('processes, chunk_size', [(None, 10000), (2, 500)])
+def test_single_pass_matches_loop(processes, chunk_size):
+    expected, actual = postings(), postings()
+    loop_job_grade(expected)
+    extract_job_grade(actual, processes=processes, chunk_size=chunk_size)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_precedence():
+    df = pd.DataFrame({'title': ['senior manager', 'assistant director', 'sales director', 'senior accountant',
+                                 'accountant'],
+                       'type': 'Full Time'})
+    extract_job_grade(df)
+    assert df.job_level.fillna('').tolist() == ['Management', 'Senior Management', 'Senior Management', 'Senior', '']
+    assert df.type.tolist() == ['Management', 'Management', 'Management', 'Full Time', 'Full Time']
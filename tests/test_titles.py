@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from conftest import notebook_value, pattern_words, synthetic_titles
+from scripts.titles import LiteralIndex, TitleMapper, required_literals
+
+MAPPINGS = [('01_cleaning_egypt', 'final_mapping_title_egypt'), ('02_cleaning_saudi', 'final_mapping_title_saudi')]
+
+
+def loop_edit_title(df, title_mapping, patterns_replace=''):
+    """The original `edit_title`: one pass over the column per pattern, in order."""
+    df.title = df.title.str.lower().str.strip()
+
+    if patterns_replace:
+        df.title = df.title.str.replace(patterns_replace, '', regex=True).str.strip()
+
+    for pattern, replacement in title_mapping.items():
+        df.loc[df.title.str.contains(pattern.lower(), regex=True), 'title'] = replacement.lower()
+
+    df.title = df.title.str.title()
+
+
+def assert_mapper_matches_loop(titles, mapping, patterns_replace=''):
+    unique = pd.Series(titles.dropna().unique())
+    expected = pd.DataFrame({'title': unique})
+    loop_edit_title(expected, mapping, patterns_replace)
+    pd.testing.assert_series_equal(TitleMapper(mapping, patterns_replace).normalize(unique), expected.title,
+                                   check_names=False)
+
+
+@pytest.mark.parametrize('notebook, name', MAPPINGS)
+def test_mapper_matches_loop(notebook, name):
+    mapping = notebook_value(notebook, name)
+    titles = synthetic_titles(pattern_words(list(mapping) + list(mapping.values())), 4000,
+                              extra=mapping.values())
+    assert_mapper_matches_loop(titles, mapping)
+    assert_mapper_matches_loop(titles, mapping, notebook_value(notebook, 'pattern_replace'))
+
+
+def test_required_literals():
+    assert required_literals(r'^account director') == {'account director'}
+    assert required_literals(r'(?=.*(account))(?=.*(receivable))') == {'receivable'}
+    assert required_literals(r'(?=.*(designer))(?=.*(ux/ui|ui/ux|ux|ui))') == {'designer'}
+    assert required_literals(r'driver|cashier') == {'driver', 'cashier'}
+    assert required_literals(r'\w+') is None
+    assert required_literals(r'(?i)manager') is None
+    assert required_literals(r'(?!.*sales)x?') is None
+
+
+def test_literal_index_finds_overlapping_literals():
+    index = LiteralIndex(['he', 'she', 'his', 'hers'])
+    assert index.find('ushers') == {'he', 'she', 'hers'}
+    assert index.find('xyz') == set()
+
+
+def test_chain_follows_replacements():
+    mapping = {r'acc': 'accountant', r'accountant': 'senior accountant', r'^sales': 'sales'}
+    mapper = TitleMapper(mapping)
+    assert mapper.chain('acc') == [0, 1]
+    assert mapper.resolve('acc') == 'senior accountant'
+    assert mapper.resolve('sales rep') == 'sales'
+    assert mapper.resolve('driver') == 'driver'
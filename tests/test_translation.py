@@ -0,0 +1,61 @@
+from scripts.translation import FakeBackend, TranslationCache, TranslationService, translation_key
+
+GLOSSARY = {'محاسب': 'Accountant', 'عامل': 'Worker'}
+CACHED = {'سائق': 'Driver', 'محاسب': 'Bookkeeper'}
+NEW = [f'مهندس {i}' for i in range(6)]
+
+
+def service(cache, backend, **options):
+    return TranslationService(backend, glossary=GLOSSARY, cache=cache, batch_size=1, max_workers=1, rate=None,
+                              **options)
+
+
+def seeded_cache(path):
+    cache = TranslationCache(path)
+    cache.put_many([(translation_key(text), text, translation) for text, translation in CACHED.items()])
+    return cache
+
+
+def test_tiers_in_order(tmp_path):
+    backend = FakeBackend(fail_every=3)
+    texts = ['محاسب', 'عامل  ', 'سائق', 'سائق'] + NEW
+    translations = service(seeded_cache(str(tmp_path / 'cache.db')), backend).translate(texts)
+
+    failed = {backend.batches[2][0], backend.batches[5][0]}
+    assert sorted(text for batch in backend.batches for text in batch) == sorted(NEW)
+    assert translations == {'محاسب': 'Accountant', 'عامل  ': 'Worker', 'سائق': 'Driver',
+                            **{text: text if text in failed else f'[en] {text}' for text in NEW}}
+
+
+def test_counters_and_failed_batches_not_cached(tmp_path):
+    cache = seeded_cache(str(tmp_path / 'cache.db'))
+    backend = FakeBackend(fail_every=3)
+    translator = service(cache, backend)
+    translator.translate(['محاسب', 'سائق'] + NEW)
+
+    assert translator.counters == {'glossary': 1, 'cache': 1, 'backend': 4, 'fallback': 2}
+    failed = {backend.batches[2][0], backend.batches[5][0]}
+    stored = cache.get_many([translation_key(text) for text in NEW])
+    assert set(stored) == {translation_key(text) for text in NEW if text not in failed}
+
+
+def test_time_budget_leaves_texts_on_fallback(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'cache.db'))
+    backend = FakeBackend()
+    translator = service(cache, backend, time_budget=0)
+
+    assert translator.translate(NEW) == {text: text for text in NEW}
+    assert backend.batches == []
+    assert translator.counters == {'glossary': 0, 'cache': 0, 'backend': 0, 'fallback': len(NEW)}
+    assert cache.stats()['entries'] == 0
+
+
+def test_second_run_served_from_cache(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = service(TranslationCache(path), FakeBackend()).translate(NEW)
+
+    backend = FakeBackend()
+    translator = service(TranslationCache(path), backend)
+    assert translator.translate(NEW) == first
+    assert backend.batches == []
+    assert translator.counters == {'glossary': 0, 'cache': len(NEW), 'backend': 0, 'fallback': 0}